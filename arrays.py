@@ -0,0 +1,87 @@
+#! /bin/env python3
+
+# Array values of the language (ObjType.ARRAY).
+#
+# An array literal of numbers is a NumArray, an array.array of int64 ('q')
+# or double ('d'), any other array is a python list. + - * / < > of a
+# NumArray with a NumArray or a number work element-wise: the elements
+# go through map() and the operator module, so a whole array is one step
+# of the interpreter and the loop runs in C. A number out of the range of
+# int64 (double) is an error, not a python list: + and * of a list would
+# concatenate and repeat instead.
+#
+# == and != compare whole arrays and give a bool, as for the other values:
+# if (a == b) is true when every element is equal, not when there is one.
+
+from array import array
+from itertools import repeat
+import operator
+
+class NumArray(array):
+    __slots__ = ()
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+def make_array(values):
+    values = list(values)
+    if not all(isinstance(value, (int, float)) for value in values):
+        return values
+    try:
+        return NumArray('q', values)
+    except OverflowError:
+        if all(isinstance(value, int) for value in values):
+            raise Exception('Array element out of the int64 range: '
+                f'{max(values, key=abs)}')
+    except TypeError: # floats
+        pass
+    try:
+        return NumArray('d', values)
+    except OverflowError:
+        raise Exception('Array element out of the double range: '
+            f'{max(values, key=abs)}')
+
+def elementwise(op):
+    def method(self, other):
+        if isinstance(other, (array, list)):
+            if len(other) != len(self):
+                raise Exception(f'Arrays of length {len(self)} and '
+                    f'{len(other)}')
+            return make_array(map(op, self, other))
+        return make_array(map(op, self, repeat(other, len(self))))
+
+    def reflected(self, other): # number op array
+        return make_array(map(op, repeat(other, len(self)), self))
+    return method, reflected
+
+NumArray.__add__, NumArray.__radd__ = elementwise(operator.add)
+NumArray.__sub__, NumArray.__rsub__ = elementwise(operator.sub)
+NumArray.__mul__, NumArray.__rmul__ = elementwise(operator.mul)
+NumArray.__truediv__, NumArray.__rtruediv__ = elementwise(operator.truediv)
+
+# Same length and elements, a list of the same numbers included
+def equal(self, other):
+    return isinstance(other, (array, list)) and len(other) == len(self) \
+        and all(map(operator.eq, self, other))
+
+NumArray.__eq__ = equal
+NumArray.__ne__ = lambda self, other: not equal(self, other)
+NumArray.__lt__ = elementwise(operator.lt)[0]
+NumArray.__gt__ = elementwise(operator.gt)[0]
+NumArray.__hash__ = None
+
+def slice_array(values, start, end=None):
+    part = values[start:end]
+    if isinstance(values, NumArray):
+        return NumArray(values.typecode, part)
+    return part
+
+# Builtin functions, also fine on strings and maps where python is
+array_builtins = {
+    'sum': sum,
+    'min': min,
+    'max': max,
+    'len': len,
+    'slice': slice_array,
+    'array': make_array, # elements of an iterator
+}
@@ -0,0 +1,437 @@
+#! /bin/env python3
+
+# On disk cache of parsed scripts, like python's .pyc files.
+#
+# The ast is stored in a compact binary format (no pickle):
+#
+#   header: MAGIC, FORMAT_VERSION, grammar version, sha256 of the source
+#   body:   nodes in preorder, each a tag byte followed by its fields
+#
+# Ints are zigzag varints, strings are varints too: 0 followed by the
+# length and the utf-8 bytes for a new string, or 1 + index of a string
+# already written. An entry whose header doesn't match the current source
+# and grammar is stale, the script is parsed again and the entry rewritten.
+
+import hashlib
+import os
+import tempfile
+
+import cache
+import parser
+
+MAGIC = b'PIAST'
+FORMAT_VERSION = 4
+
+# Tag of each node type, the index in this tuple.
+# str is the empty statement ';' which the parser keeps as a plain string
+node_types = (
+    str,
+    parser.Number,
+    parser.String,
+    parser.Null,
+    parser.BinOp,
+    parser.Map,
+    parser.GetItem,
+    parser.Block,
+    parser.IfStmt,
+    parser.SetVar,
+    parser.GetVar,
+    parser.ParamList,
+    parser.Defunc,
+    parser.ArgList,
+    parser.Call,
+    parser.DefCls,
+    parser.SetAttr,
+    parser.GetAttr,
+    parser.WhileStmt,
+    parser.Array,
+    parser.ForStmt,
+)
+node_tags = {node_type: tag for tag, node_type in enumerate(node_types)}
+
+def source_hash(source):
+    if isinstance(source, str):
+        source = source.encode()
+    return hashlib.sha256(source).digest()
+
+def header(source):
+    return MAGIC + bytes([FORMAT_VERSION]) + \
+        cache.grammar_version().encode() + source_hash(source)
+
+def dump(ast, source):
+    out = bytearray(header(source))
+    strings = {}
+
+    def uint(value):
+        while value >= 0x80:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+
+    def int_(value):
+        uint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+    def str_(value):
+        if value in strings:
+            uint(strings[value] + 1)
+            return
+        strings[value] = len(strings)
+        data = value.encode()
+        uint(0)
+        uint(len(data))
+        out.extend(data)
+
+    def nodes(values):
+        uint(len(values))
+        [node(value) for value in values]
+
+    def node(value):
+        if type(value) not in node_tags:
+            raise ValueError(f'Can not dump {value}')
+        out.append(node_tags[type(value)])
+        node_to_writer[type(value)](value)
+
+    def leaf(n):
+        pass
+
+    def binop(n):
+        str_(n.op)
+        node(n.left)
+        node(n.right)
+
+    def map(n):
+        nodes([x for item in n.body.items() for x in item])
+
+    def getitem(n):
+        node(n.container)
+        node(n.index)
+
+    def ifstmt(n):
+        node(n.cond)
+        node(n.body)
+        uint(n.else_body is not None)
+        if n.else_body is not None:
+            node(n.else_body)
+
+    def whilestmt(n):
+        node(n.cond)
+        node(n.body)
+
+    def forstmt(n):
+        str_(n.name)
+        node(n.iterable)
+        node(n.body)
+
+    def setvar(n):
+        str_(n.name)
+        node(n.value)
+
+    def paramlist(n):
+        uint(len(n.body))
+        [str_(param) for param in n.body]
+
+    def defunc(n):
+        str_(n.name)
+        node(n.params)
+        node(n.body)
+
+    def call(n):
+        node(n.func)
+        node(n.args)
+
+    def defcls(n):
+        str_(n.name)
+        nodes(n.body)
+
+    def setattr(n):
+        node(n.obj)
+        str_(n.attr)
+        node(n.value)
+
+    def getattr(n):
+        node(n.obj)
+        str_(n.attr)
+
+    node_to_writer = {
+        str: str_,
+        parser.Number: lambda n: int_(n.value),
+        parser.String: lambda n: str_(n.value),
+        parser.Null: leaf,
+        parser.BinOp: binop,
+        parser.Map: map,
+        parser.GetItem: getitem,
+        parser.Block: lambda n: nodes(n.body),
+        parser.IfStmt: ifstmt,
+        parser.SetVar: setvar,
+        parser.GetVar: lambda n: str_(n.name),
+        parser.ParamList: paramlist,
+        parser.Defunc: defunc,
+        parser.ArgList: lambda n: nodes(n.body),
+        parser.Call: call,
+        parser.DefCls: defcls,
+        parser.SetAttr: setattr,
+        parser.GetAttr: getattr,
+        parser.WhileStmt: whilestmt,
+        parser.Array: lambda n: nodes(n.body),
+        parser.ForStmt: forstmt,
+    }
+
+    node(ast)
+    return bytes(out)
+
+def load(data, source=None):
+    prefix = header(source) if source is not None else MAGIC
+    if not data.startswith(prefix):
+        raise ValueError('Stale or invalid ast cache')
+
+    pos = len(header(b''))
+    strings = []
+
+    def uint():
+        nonlocal pos
+        byte = data[pos]
+        pos += 1
+        if byte < 0x80: # most of them
+            return byte
+        result, shift = byte & 0x7f, 7
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def int_():
+        value = uint()
+        return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+    def str_():
+        nonlocal pos
+        index = uint()
+        if index:
+            return strings[index - 1]
+        length = uint()
+        value = data[pos:pos + length].decode()
+        pos += length
+        strings.append(value)
+        return value
+
+    def nodes():
+        return [node() for _ in range(uint())]
+
+    def node():
+        nonlocal pos
+        tag = data[pos]
+        pos += 1
+        return readers[tag]()
+
+    # Nodes are built without __init__, fields are read in dump order
+
+    def number():
+        n = parser.Number.__new__(parser.Number)
+        n.value = int_()
+        return n
+
+    def string():
+        n = parser.String.__new__(parser.String)
+        n.value = str_()
+        return n
+
+    def null():
+        return parser.Null.__new__(parser.Null)
+
+    def binop():
+        n = parser.BinOp.__new__(parser.BinOp)
+        n.op = str_()
+        n.left = node()
+        n.right = node()
+        n.cache = None
+        return n
+
+    def map():
+        n = parser.Map.__new__(parser.Map)
+        items = nodes()
+        n.body = dict(zip(items[::2], items[1::2]))
+        return n
+
+    def getitem():
+        n = parser.GetItem.__new__(parser.GetItem)
+        n.container = node()
+        n.index = node()
+        return n
+
+    def array():
+        n = parser.Array.__new__(parser.Array)
+        n.body = nodes()
+        return n
+
+    def block():
+        n = parser.Block.__new__(parser.Block)
+        n.body = nodes()
+        return n
+
+    def ifstmt():
+        n = parser.IfStmt.__new__(parser.IfStmt)
+        n.cond = node()
+        n.body = node()
+        n.else_body = node() if uint() else None
+        return n
+
+    def whilestmt():
+        n = parser.WhileStmt.__new__(parser.WhileStmt)
+        n.cond = node()
+        n.body = node()
+        return n
+
+    def forstmt():
+        n = parser.ForStmt.__new__(parser.ForStmt)
+        n.name = str_()
+        n.iterable = node()
+        n.body = node()
+        return n
+
+    def setvar():
+        n = parser.SetVar.__new__(parser.SetVar)
+        n.name = str_()
+        n.value = node()
+        return n
+
+    def getvar():
+        n = parser.GetVar.__new__(parser.GetVar)
+        n.name = str_()
+        return n
+
+    def paramlist():
+        n = parser.ParamList.__new__(parser.ParamList)
+        n.body = [str_() for _ in range(uint())]
+        return n
+
+    def defunc():
+        n = parser.Defunc.__new__(parser.Defunc)
+        n.name = str_()
+        n.params = node()
+        n.body = node()
+        return n
+
+    def arglist():
+        n = parser.ArgList.__new__(parser.ArgList)
+        n.body = nodes()
+        return n
+
+    def call():
+        n = parser.Call.__new__(parser.Call)
+        n.func = node()
+        n.args = node()
+        return n
+
+    def defcls():
+        n = parser.DefCls.__new__(parser.DefCls)
+        n.name = str_()
+        n.body = nodes()
+        return n
+
+    def setattr():
+        n = parser.SetAttr.__new__(parser.SetAttr)
+        n.obj = node()
+        n.attr = str_()
+        n.value = node()
+        return n
+
+    def getattr():
+        n = parser.GetAttr.__new__(parser.GetAttr)
+        n.obj = node()
+        n.attr = str_()
+        n.cache = None
+        return n
+
+    node_to_reader = {
+        str: str_,
+        parser.Number: number,
+        parser.String: string,
+        parser.Null: null,
+        parser.BinOp: binop,
+        parser.Map: map,
+        parser.GetItem: getitem,
+        parser.Block: block,
+        parser.IfStmt: ifstmt,
+        parser.SetVar: setvar,
+        parser.GetVar: getvar,
+        parser.ParamList: paramlist,
+        parser.Defunc: defunc,
+        parser.ArgList: arglist,
+        parser.Call: call,
+        parser.DefCls: defcls,
+        parser.SetAttr: setattr,
+        parser.GetAttr: getattr,
+        parser.WhileStmt: whilestmt,
+        parser.Array: array,
+        parser.ForStmt: forstmt,
+    }
+    readers = [node_to_reader[node_type] for node_type in node_types]
+
+    try:
+        return node()
+    except (IndexError, KeyError, UnicodeDecodeError) as e:
+        raise ValueError(f'Invalid ast cache: {e}')
+
+# One entry per script and parser backend: main.py -p pratt parses with
+# pratt.py, it doesn't read what the yacc parser left
+def cache_path(path, cache_dir=None):
+    directory = os.path.join(cache.cache_dir(cache_dir), 'ast')
+    os.makedirs(directory, exist_ok=True)
+    name = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(directory, f'{os.path.basename(path)}.{name}.'
+        f'{parser.default_backend}.ast')
+
+def parse_source(source):
+    return parser.parse(source)
+
+# Ast of the script at path, parsed only when the cache entry is stale
+# Text mode, as before the cache: \r\n and \r read as \n. The text parsed
+# is the text hashed
+def parse_file(path, cache_dir=None):
+    with open(path) as f:
+        source = f.read()
+
+    entry = cache_path(path, cache_dir)
+    try:
+        with open(entry, 'rb') as f:
+            return load(f.read(), source)
+    except (OSError, ValueError):
+        pass
+
+    ast = parse_source(source)
+    write_entry(entry, dump(ast, source))
+    return ast
+
+# Write to a file of this writer only, then rename it over entry: readers
+# and other writers never see a partial entry. A failed write leaves the
+# cache as it was
+def write_entry(entry, data):
+    temp = None
+    try:
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(entry),
+                prefix=os.path.basename(entry) + '.', suffix='.tmp',
+                delete=False) as f:
+            temp = f.name
+            f.write(data)
+        os.replace(temp, entry)
+    except OSError:
+        if temp is not None:
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    print('Test astcache')
+
+    source_file = "test.py"
+    data = open(source_file, 'r').read()
+
+    ast = parse_source(data)
+    binary = dump(ast, data)
+    print(f'{len(data)} bytes of source, {len(binary)} bytes of ast')
+    assert dump(load(binary, data), data) == binary
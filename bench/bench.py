@@ -0,0 +1,185 @@
+#! /bin/env python3
+
+# Benchmark suite: times tokenizing (my_lexer), parsing (my_parser),
+# running (interpreter) and rendering (inspector) every workload.
+#
+#   ./bench/bench.py run [-o result.json] [--engine tree] [--repeat 5]
+#                        [--workloads arith ...] [--phases lex parse ...]
+#   ./bench/bench.py compare old.json new.json [--threshold 0.10]
+#
+# Workloads are the bench/workloads/*.src scripts plus the generated ones
+# of generate.py. compare flags every (workload, phase) whose median got
+# slower than the threshold, and exits with 1 if there is any.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import generate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+PHASES = ('lex', 'parse', 'interpret', 'inspect')
+
+generated_workloads = {
+    'big_map': lambda: generate.big_map(2000),
+    'big_array': lambda: generate.big_array(10000),
+    'large_source': lambda: generate.program(500),
+}
+
+def workloads():
+    sources = {}
+    directory = os.path.join(BENCH_DIR, 'workloads')
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.src'):
+            with open(os.path.join(directory, name)) as f:
+                sources[name[:-len('.src')]] = f.read()
+    for name, source in generated_workloads.items():
+        sources[name] = source()
+    return sources
+
+def engines():
+    from interpreter import interpreter
+    from closure import closure_interpreter
+    from vm import vm_interpreter
+
+    return {
+        'tree': interpreter,
+        'closure': closure_interpreter,
+        'vm': vm_interpreter,
+    }
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times)}
+
+def bench(source, phases, engine, repeat):
+    from lexer import my_lexer
+    from parser import my_parser
+    from inspector import inspector
+
+    lexer = my_lexer()
+    parser = my_parser()
+    ast = parser.parse(source)
+
+    def lex():
+        lexer.input(source)
+        for token in lexer:
+            pass
+
+    # Every run gets a fresh ast, the inline caches live in it
+    asts = [parser.parse(source) for _ in range(repeat)] \
+        if 'interpret' in phases else []
+
+    phase_to_func = {
+        'lex': lex,
+        'parse': lambda: parser.parse(source),
+        'interpret': lambda: engine(asts.pop()),
+        'inspect': lambda: inspector(ast),
+    }
+
+    results = {}
+    for phase in phases:
+        result = timeit(phase_to_func[phase], repeat)
+        results[phase] = {key: round(value, 6)
+            for key, value in result.items()}
+    return results
+
+def run(args):
+    sys.setrecursionlimit(20000) # scripts loop by recursion
+    engine = engines()[args.engine]
+    sources = workloads()
+    names = args.workloads or list(sources)
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp) # inspector writes ast.html in the current directory
+        try:
+            for name in names:
+                results[name] = bench(sources[name], args.phases, engine,
+                    args.repeat)
+                print(name, results[name], file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    report = {
+        'meta': {
+            'commit': commit,
+            'python': platform.python_version(),
+            'engine': args.engine,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)['results']
+    with open(args.new) as f:
+        new = json.load(f)['results']
+
+    regressions = 0
+    print(f'{"workload":16}{"phase":11}{"old":>11}{"new":>11}{"change":>9}')
+    for name in old:
+        for phase in old[name]:
+            if phase not in new.get(name, {}):
+                continue
+            before = old[name][phase]['median']
+            after = new[name][phase]['median']
+            change = (after - before) / before if before else 0
+            flag = ''
+            if change > args.threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f'{name:16}{phase:11}{before:11.4f}{after:11.4f}'
+                f'{change:+9.1%}{flag}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    commands = args.add_subparsers(dest='command', required=True)
+
+    run_args = commands.add_parser('run')
+    run_args.add_argument('-o', '--output', help='json file, stdout if not set')
+    run_args.add_argument('--engine', default='tree',
+        choices=('tree', 'closure', 'vm'))
+    run_args.add_argument('--repeat', type=int, default=5)
+    run_args.add_argument('--workloads', nargs='*')
+    run_args.add_argument('--phases', nargs='*', default=list(PHASES),
+        choices=PHASES)
+
+    compare_args = commands.add_parser('compare')
+    compare_args.add_argument('old')
+    compare_args.add_argument('new')
+    compare_args.add_argument('--threshold', type=float, default=0.10,
+        help='relative slow down flagged as a regression')
+
+    args = args.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
@@ -0,0 +1,42 @@
+#! /bin/env python3
+
+# Generated workloads, too large to keep as files
+
+# `size` snippets of functions, maps, classes and calls (~60 nodes each)
+def program(size):
+    parts = []
+    for i in range(size):
+        parts.append(f'''
+def func{i}(a, b){{
+    c = a + b * {i};
+    if (c > {i}) {{ c - 1; }} else {{ c + 1; }}
+}}
+map{i} = {{'key': {i}, {i}: 'value', 'nested': {{'a': {i}}}}};
+class Cls{i} {{
+    v = {i} + 1;
+    def get(self, x) {{ self.v = x; self.v; }}
+}}
+obj{i} = Cls{i}();
+result = obj{i}.get(func{i}(map{i}['key'], {i}));
+''')
+    return ''.join(parts)
+
+# One map literal of `size` entries, plus lookups into it
+def big_map(size):
+    items = []
+    for i in range(size):
+        items.append(f"    {i}: {{'name': 'item{i}', 'value': {i} * 2}},")
+        items.append(f"    'key{i}': {i},")
+    # temporaries, `a + b[i][j]` would parse as `(a + b[i])[j]`
+    lookups = ''.join(f"v = data[{i}]['value'];\nk = data['key{i}'];\n"
+        "x = v + k;\n" for i in range(0, size, 10))
+    return 'data = {\n' + '\n'.join(items)[:-1] + '\n};\n' + lookups
+
+# Two array literals of `size` numbers and bulk operations over them
+def big_array(size):
+    a = ', '.join(str(i) for i in range(size))
+    b = ', '.join(str(size - i) for i in range(size))
+    return (f'a = [{a}];\nb = [{b}];\n' +
+        'c = a * b + a - 3;\nd = c / 2;\nm = a < b;\n' * 50 +
+        # temporaries, `x + f(y)` would parse as `(x + f)(y)`
+        's = sum(c);\nt = max(b);\nu = min(a);\nv = len(d);\n')
@@ -0,0 +1,70 @@
+#! /bin/env python3
+
+# Import time budget of a plain run: ./main.py on a script which prints
+# nothing, in a fresh process under python -X importtime. Fails if a heavy
+# module only some options need got imported, or if the imports took
+# longer than the budget.
+#
+#   ./bench/imports.py [--budget 0.15]
+#
+# Exits with 1 when over budget.
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded by --inspect, --profile, -O, --parser pratt, the other engines or
+# print()
+HEAVY = ('rich', 'pyecharts', 'inspector', 'profiler', 'optimizer',
+    'closure', 'vm', 'stream', 'pratt', 'fastlexer')
+
+SCRIPT = 'a = 1 + 2;\nb = {"a": a};\na;\n'
+
+# [(module, cumulative seconds, depth)] of an -X importtime report
+def import_times(report):
+    times = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), int(cumulative) / 1e6, depth))
+    return times
+
+def measure():
+    with tempfile.TemporaryDirectory() as cwd:
+        script = os.path.join(cwd, 'plain.src')
+        with open(script, 'w') as f:
+            f.write(SCRIPT)
+        report = subprocess.run([sys.executable, '-X', 'importtime',
+            os.path.join(ROOT, 'main.py'), script], cwd=cwd, check=True,
+            capture_output=True, text=True).stderr
+    return import_times(report)
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--budget', type=float, default=0.15,
+        help='seconds for all the imports of a plain run')
+    args = args.parse_args()
+
+    times = measure()
+    total = sum(seconds for name, seconds, depth in times if depth == 0)
+    heavy = sorted({name.split('.')[0] for name, seconds, depth in times
+        if name.split('.')[0] in HEAVY})
+
+    print(f'imports {total:.3f}s, budget {args.budget:.3f}s')
+    for name, seconds, depth in sorted(times, key=lambda t: -t[1])[:10]:
+        if depth == 0:
+            print(f'    {name:24}{seconds:.3f}s')
+    failed = False
+    if heavy:
+        print('heavy modules imported:', ', '.join(heavy))
+        failed = True
+    if total > args.budget:
+        print('over budget')
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,81 @@
+#! /bin/env python3
+
+# fastlexer against my_lexer(): checks they give the same tokens (type,
+# value, lineno, lexpos) and the same errors on every workload and some
+# edge cases, then times tokenizing and parsing with each one.
+#
+#   ./bench/lexers.py [--repeat 5] [--workloads arith ...]
+#
+# Exits with 1 if the tokens differ.
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+
+import bench
+
+EDGE_CASES = {
+    'illegal': 'a = 1 $ 2; @b\r\n',
+    'strings': '"multi\nline" \'it"s\' "" "// not a comment" x; // "no',
+    'unterminated': 'a = "open;\nb = 2;',
+    'numbers': '123abc 0 007 if1 _if in for',
+    'operators': 'a==b=!c!=d&&e||f|g&h<>=:.',
+}
+
+def tokens_of(lexer, source):
+    lexer.lineno = 1
+    errors = io.StringIO()
+    with contextlib.redirect_stdout(errors):
+        lexer.input(source)
+        tokens = [(t.type, t.value, t.lineno, t.lexpos) for t in lexer]
+    return tokens, errors.getvalue(), lexer.lineno
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--repeat', type=int, default=5)
+    args.add_argument('--workloads', nargs='*')
+    args = args.parse_args()
+
+    from lexer import my_lexer
+    from fastlexer import fast_lexer, tokenize
+    from parser import Parser
+
+    sources = bench.workloads()
+    names = args.workloads or list(sources)
+    ply_lexer = my_lexer()
+    fast = fast_lexer()
+
+    wrong = [name for name, source in list(EDGE_CASES.items()) +
+        [(name, sources[name]) for name in names]
+        if tokens_of(ply_lexer, source) != tokens_of(fast, source)]
+    for name in wrong:
+        print(f'{name}: the tokens differ')
+
+    ply_parser = Parser()
+    fast_parser = Parser(fast_lexer=True)
+    print(f'{"workload":16}{"tokens":>8}{"ply lex":>10}{"fast lex":>10}'
+        f'{"arrays":>10}{"ply parse":>11}{"fast parse":>11}')
+    for name in names:
+        source = sources[name]
+        count = len(tokenize(source))
+        times = [
+            timeit(lambda: tokens_of(ply_lexer, source), args.repeat),
+            timeit(lambda: tokens_of(fast, source), args.repeat),
+            timeit(lambda: tokenize(source), args.repeat),
+            timeit(lambda: ply_parser.parse(source), args.repeat),
+            timeit(lambda: fast_parser.parse(source), args.repeat),
+        ]
+        print(f'{name:16}{count:8}' + ''.join(f'{t:10.4f}' for t in times[:3])
+            + ''.join(f'{t:11.4f}' for t in times[3:]))
+    sys.exit(1 if wrong else 0)
@@ -0,0 +1,104 @@
+#! /bin/env python3
+
+# Memory used to parse a large generated program and to keep its ast.
+#
+#   ./bench/memory.py [--size N] [--compare CHECKOUT ...]
+#
+# Every checkout (this one, then each --compare one, e.g. a `git worktree`
+# of an older commit) is measured in a fresh process, from a temporary
+# directory so ply doesn't write its tables in the source tree.
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def count_nodes(ast):
+    import parser
+
+    count = 0
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, parser.AstNode):
+            count += 1
+            for name in dir(node):
+                if not name.startswith('_'):
+                    value = getattr(node, name, None)
+                    if not callable(value):
+                        stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            stack.extend(node.keys())
+            stack.extend(node.values())
+    return count
+
+def measure(checkout, size):
+    sys.path.insert(0, checkout)
+    from lexer import my_lexer
+    from parser import my_parser
+
+    my_lexer()
+    parser = my_parser()
+    data = generate.program(size)
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    start = time.perf_counter()
+    ast = parser.parse(data)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+
+    nodes = count_nodes(ast)
+    return {
+        'checkout': checkout,
+        'source_bytes': len(data),
+        'nodes': nodes,
+        'ast_bytes': current,
+        'bytes_per_node': round(current / nodes, 1),
+        'parse_peak_bytes': peak,
+        'ast_blocks': blocks,
+        'parse_seconds': round(elapsed, 3),
+    }
+
+def run(checkout, size):
+    with tempfile.TemporaryDirectory() as cwd:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__),
+            '--measure', checkout, '--size', str(size)],
+            cwd=cwd, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--size', type=int, default=2000,
+        help='number of generated snippets (about 60 nodes each)')
+    args.add_argument('--compare', nargs='*', default=[],
+        help='other checkouts to measure, e.g. a worktree of the baseline')
+    args.add_argument('--measure', help=argparse.SUPPRESS)
+    args = args.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.size)))
+        sys.exit()
+
+    results = [run(checkout, args.size)
+        for checkout in [ROOT] + args.compare]
+    keys = [key for key in results[0] if key != 'checkout']
+    print(f'{"":18}' + ''.join(f'{os.path.basename(r["checkout"]):>16}'
+        for r in results))
+    for key in keys:
+        print(f'{key:18}' + ''.join(f'{r[key]:>16}' for r in results))
@@ -0,0 +1,227 @@
+#! /bin/env python3
+
+# pratt.parse() against my_parser(): checks they give the same ast, or the
+# same SyntaxError, on a corpus, then times parsing with each one.
+#
+#   ./bench/parsers.py [--repeat 5] [--random 2000] [--seed 1]
+#                      [--workloads arith ...]
+#
+# The corpus is the workloads, test.py, the edge cases below, random
+# programs of the grammar and the same programs with one token deleted,
+# doubled or replaced (mostly syntax errors). Asts are compared through
+# their astcache encoding. Exits with 1 if any case differs.
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import bench
+
+EDGE_CASES = {
+    'call_after_op': 'x = a + f(1); y = a * b[0]; z = a.b(c) + d.e[f];',
+    'precedence': 'x = a || b && c == d < e + f * g - h / i > j != k;',
+    'left_assoc': 'x = a - b - c; y = a / b / c; z = a < b < c;',
+    'postfix': 'f(1)(2)[3].a.b(4); (a + b)(c); a[0][1] = 2;',
+    'set_attr': 'a.b = 1; a.b.c = f(x); f(x).y = 2; (a).b = 3;',
+    'set_attr_parens': '(a.b) = 1;',
+    'set_attr_op': 'a + b.c = 1;',
+    'empty_first': 'f(, a); x = [, 1, 2]; def g(, a, b) { a; }',
+    'else_chain': 'if (a) { 1; } else { 2; } else { 3; } ;;',
+    'classes': 'class A { ; } class B { def f() { 1; } x = 2; def g(a) '
+        '{ a; } } class C { x = 1; y = 2; }',
+    'class_two_semis': 'class A { ; ; }',
+    'class_expr': 'class A { x; }',
+    'maps': 'm = {1: 2, "a": {b: c}, f(x): [1]}; {a: 1}; {a: 1}[a];',
+    'loops': 'for (x in [1, 2]) { while (x < 3) { x = x + 1; } }',
+    'comments': '// a\na = 1; # b\n\n// c\nb = "// d"; // e\n',
+    'strings': 'a = "x\ny" + \'z\';\n\n\nb = $;\nc = 1 1;',
+    'empty': '',
+    'only_comment': '// nothing',
+    'no_semicolon': 'a = 1',
+    'unbalanced': 'a = (1 + 2;',
+    'empty_block': 'if (a) { }',
+    'stray_brace': 'a;\n}\nb;',
+    'else_if': 'if (a) { 1; } else if (b) { 2; }',
+    'assign_expr': 'x = y = 1;',
+}
+
+# Random programs of the grammar, the rules picked at random
+def random_program(rng, statements=8):
+    def name():
+        return rng.choice('abcdefxyz') + rng.choice(['', '1', '_'])
+
+    def expr(depth):
+        kind = rng.randrange(12 if depth < 3 else 4)
+        if kind == 0:
+            return str(rng.randrange(100))
+        if kind == 1:
+            return rng.choice(['"s"', "'t'", '"a b"', '""'])
+        if kind == 2:
+            return rng.choice(['null', name()])
+        if kind == 3:
+            return name()
+        if kind in (4, 5, 6):
+            op = rng.choice(['+', '-', '*', '/', '==', '!=', '<', '>',
+                '&&', '||'])
+            return f'{expr(depth + 1)} {op} {expr(depth + 1)}'
+        if kind == 7:
+            return f'{expr(depth + 1)}({args(depth + 1)})'
+        if kind == 8:
+            return f'{expr(depth + 1)}[{expr(depth + 1)}]'
+        if kind == 9:
+            return f'{expr(depth + 1)}.{name()}'
+        if kind == 10:
+            return f'({expr(depth + 1)})'
+        if rng.random() < 0.5:
+            return f'[{args(depth + 1)}]'
+        items = ', '.join(f'{expr(depth + 1)}: {expr(depth + 1)}'
+            for _ in range(rng.randrange(1, 4)))
+        return '{' + items + '}'
+
+    def args(depth):
+        items = [expr(depth) for _ in range(rng.randrange(4))]
+        lead = ', ' if items and rng.random() < 0.1 else ''
+        return lead + ', '.join(items)
+
+    def block(depth):
+        return ' '.join(stmt(depth + 1)
+            for _ in range(rng.randrange(1, 4)))
+
+    def function(depth):
+        params = ', '.join(name() for _ in range(rng.randrange(3)))
+        return f'def {name()}({params}) {{ {block(depth)} }}'
+
+    def stmt(depth):
+        kind = rng.randrange(11 if depth < 3 else 5)
+        if kind in (0, 1):
+            return f'{expr(0)};'
+        if kind == 2:
+            return f'{name()} = {expr(0)};'
+        if kind == 3: # not a binary operation: a + b.c = 1 is an error
+            obj = rng.choice([name(), f'({expr(1)})', f'{name()}()'])
+            return f'{obj}.{name()} = {expr(0)};'
+        if kind == 4: # a block is not empty, a comment needs a ';' too
+            return rng.choice([';', '; // comment\n', '; # comment\n'])
+        if kind == 5:
+            text = f'if ({expr(0)}) {{ {block(depth)} }}'
+            for _ in range(rng.randrange(3)):
+                text += f' else {{ {block(depth)} }}'
+            return text
+        if kind == 6:
+            return f'while ({expr(0)}) {{ {block(depth)} }}'
+        if kind == 7:
+            return f'for ({name()} in {expr(0)}) {{ {block(depth)} }}'
+        if kind == 8:
+            return function(depth)
+        members = [rng.choice([function(depth), f'{name()} = {expr(0)};'])
+            for _ in range(rng.randrange(1, 4))]
+        if rng.random() < 0.2:
+            members[0] = ';'
+        return f'class {name()} {{ {" ".join(members)} }}'
+
+    return '\n'.join(stmt(0) for _ in range(statements))
+
+# The program with one token deleted, doubled or replaced by another one
+def mutate(rng, source):
+    from fastlexer import tokenize
+
+    texts = tokenize(source).texts
+    if not texts:
+        return source
+    at = rng.randrange(len(texts))
+    change = rng.randrange(3)
+    if change == 0:
+        del texts[at]
+    elif change == 1:
+        texts.insert(at, texts[at])
+    else:
+        texts[at] = rng.choice(texts + ['=', ';', '.', ')', 'else', 'in'])
+    # newlines, for the line of the errors
+    return ''.join(text + rng.choice(' \n') for text in texts)
+
+# astcache encoding of the ast of source, or the SyntaxError
+def outcome(parse, source):
+    import astcache
+
+    try:
+        return astcache.dump(parse(source), '')
+    except SyntaxError as e:
+        return f'SyntaxError: {e}'
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+# Seconds to import the parser and parse one statement in a new process,
+# the LALR tables of the yacc backend already in the cache
+def startup(backend):
+    code = ('import sys, time\nstart = time.perf_counter()\n'
+        f'sys.path.insert(0, {bench.ROOT!r})\n'
+        'from parser import Parser\n'
+        f'Parser(backend={backend!r}).parse("a = 1;")\n'
+        'print(time.perf_counter() - start)\n')
+    return float(subprocess.run([sys.executable, '-c', code], check=True,
+        capture_output=True, text=True).stdout)
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--repeat', type=int, default=5)
+    args.add_argument('--random', type=int, default=2000,
+        help='random programs, each one also mutated')
+    args.add_argument('--seed', type=int, default=1)
+    args.add_argument('--workloads', nargs='*')
+    args = args.parse_args()
+
+    import contextlib
+    import io
+
+    from parser import Parser
+
+    sources = bench.workloads()
+    names = args.workloads or list(sources)
+    with open(os.path.join(bench.ROOT, 'test.py')) as f:
+        corpus = dict(EDGE_CASES, test=f.read())
+    corpus.update((name, sources[name]) for name in names)
+    rng = random.Random(args.seed)
+    for number in range(args.random):
+        program = random_program(rng)
+        corpus[f'random{number}'] = program
+        corpus[f'mutated{number}'] = mutate(rng, program)
+
+    yacc = Parser(backend='yacc')
+    pratt = Parser(backend='pratt')
+    wrong = []
+    errors = 0
+    with contextlib.redirect_stdout(io.StringIO()): # illegal characters
+        for name, source in corpus.items():
+            expected = outcome(yacc.parse, source)
+            errors += isinstance(expected, str)
+            if outcome(pratt.parse, source) != expected:
+                wrong.append(name)
+    for name in wrong:
+        print(f'{name}: the parsers differ\n{corpus[name]}')
+    print(f'{len(corpus)} sources ({errors} syntax errors), '
+        f'{len(wrong)} differ')
+
+    from fastlexer import tokenize
+
+    print(f'{"workload":16}{"tokens/s yacc":>14}{"pratt":>14}'
+        f'{"yacc":>10}{"pratt":>10}')
+    for name in names:
+        source = sources[name]
+        tokens = len(tokenize(source))
+        times = [timeit(lambda: yacc.parse(source), args.repeat),
+            timeit(lambda: pratt.parse(source), args.repeat)]
+        print(f'{name:16}{tokens / times[0]:14.0f}{tokens / times[1]:14.0f}'
+            + ''.join(f'{t:10.4f}' for t in times))
+    print(f'{"startup":16}{"":28}' + ''.join(f'{startup(backend):10.4f}'
+        for backend in ('yacc', 'pratt')))
+    sys.exit(1 if wrong else 0)
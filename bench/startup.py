@@ -0,0 +1,62 @@
+#! /bin/env python3
+
+# Startup time of my_lexer() + my_parser(), cold (empty table cache) and
+# warm (tables already in the cache), each run in a fresh process.
+#
+#   ./bench/startup.py [--runs N]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP = '''
+import sys, time
+times = [time.perf_counter()]
+sys.path.insert(0, %r)
+from lexer import my_lexer
+from parser import my_parser
+times.append(time.perf_counter())
+my_lexer()
+times.append(time.perf_counter())
+my_parser()
+times.append(time.perf_counter())
+print(*[end - start for start, end in zip(times, times[1:])])
+''' % ROOT
+
+PHASES = ('import_seconds', 'lexer_seconds', 'parser_seconds')
+
+def startup(cache_dir, cwd):
+    env = dict(os.environ, INTERPRETER_CACHE_DIR=cache_dir)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', STARTUP], env=env,
+        cwd=cwd, check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - start
+    return [float(t) for t in output.split()] + [total]
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--runs', type=int, default=5)
+    args = args.parse_args()
+
+    cold, warm = [], []
+    with tempfile.TemporaryDirectory() as cwd:
+        for run in range(args.runs):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cold.append(startup(cache_dir, cwd))
+                warm.append(startup(cache_dir, cwd))
+
+    result = {}
+    for name, runs in (('cold', cold), ('warm', warm)):
+        result[name] = {phase: round(statistics.median(r[i] for r in runs), 4)
+            for i, phase in enumerate(PHASES + ('process_seconds',))}
+    build = lambda times: times['lexer_seconds'] + times['parser_seconds']
+    result['build_speedup'] = round(build(result['cold']) /
+        build(result['warm']), 1)
+    print(json.dumps(result, indent=4))
@@ -0,0 +1,75 @@
+#! /bin/env python3
+
+# Stress test of concurrent parsing: parses the workloads and generated
+# sources many times from a thread pool, every thread with its own
+# parser.Parser, and checks each ast against the one parsed serially.
+#
+#   ./bench/threads.py [--threads 8] [--rounds 20] [--shared]
+#
+# --shared uses one my_parser() for all the threads instead, the way that
+# is not safe, to see it break. Exits with 1 if any ast is wrong.
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import generate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+def sources():
+    result = []
+    directory = os.path.join(BENCH_DIR, 'workloads')
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.src'):
+            with open(os.path.join(directory, name)) as f:
+                result.append(f.read())
+    result += [generate.program(size) for size in (1, 7, 30, 100)]
+    result += [generate.big_map(size) for size in (10, 200)]
+    result += [generate.big_array(size) for size in (5, 500)]
+    return result
+
+def run(args):
+    import astcache
+    import parser
+
+    texts = sources()
+    reference = parser.Parser()
+    expected = [astcache.dump(reference.parse(text), text) for text in texts]
+
+    if args.shared:
+        from lexer import my_lexer
+        my_lexer()
+        shared = parser.my_parser()
+        parse = shared.parse
+    else:
+        parse = parser.parse # a Parser per thread
+
+    def check(index):
+        text = texts[index]
+        try:
+            return astcache.dump(parse(text), text) == expected[index]
+        except Exception:
+            return False
+
+    jobs = [index for _ in range(args.rounds) for index in range(len(texts))]
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(check, jobs))
+    elapsed = time.perf_counter() - start
+
+    wrong = results.count(False)
+    print(f'{len(jobs)} parses on {args.threads} threads in {elapsed:.2f}s, '
+        f'{wrong} wrong')
+    return 1 if wrong else 0
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser()
+    args.add_argument('--threads', type=int, default=8)
+    args.add_argument('--rounds', type=int, default=20)
+    args.add_argument('--shared', action='store_true',
+        help='share one my_parser() between the threads')
+    sys.exit(run(args.parse_args()))
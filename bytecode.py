@@ -0,0 +1,317 @@
+#! /bin/env python3
+
+# Compile the ast into a flat bytecode for the stack based vm (vm.py).
+#
+# Every instruction is two ints in CodeObj.code: (opcode, argument).
+# The argument indexes CodeObj.consts / CodeObj.names, or is a jump target
+# (offset in CodeObj.code), or an item count.
+
+from array import array
+
+import parser
+from interpreter import binary_operators, AttrCache
+
+opnames = (
+    'LOAD_CONST',           # push consts[arg]
+    'LOAD_NAME',            # push variable names[arg]
+    'STORE_NAME',           # pop into variable names[arg]
+    'POP_TOP',              # pop and discard
+    'BINARY_OP',            # pop right, left; push operators[arg](left, right)
+    'BUILD_MAP',            # pop arg (key, value) pairs; push dict
+    'GET_ITEM',             # pop index, container; push container[index]
+    'GET_ATTR',             # pop obj; push obj.attr of inline cache caches[arg]
+    'SET_ATTR',             # pop value, obj; obj.names[arg] = value
+    'JUMP',                 # jump to arg
+    'POP_JUMP_IF_FALSE',    # pop; jump to arg if false
+    'MAKE_FUNCTION',        # push function of code consts[arg]
+    'MAKE_CLASS',           # pop arg (name, value) pairs; push class (name on top)
+    'CALL',                 # pop arg args and the function; push result
+    'RETURN',               # return top of stack to the caller
+    'TAIL_CALL',            # CALL whose result is returned, reuses the frame
+    'JUMP_IF_FALSE_OR_POP', # jump to arg if top is false, else pop (&&)
+    'JUMP_IF_TRUE_OR_POP',  # jump to arg if top is true, else pop (||)
+    'BUILD_ARRAY',          # pop arg items; push array
+    'GET_ITER',             # replace top with an iterator over it
+    'FOR_ITER',             # push next of iterator on top; at end pop it and
+                            # jump to arg
+)
+(LOAD_CONST, LOAD_NAME, STORE_NAME, POP_TOP, BINARY_OP, BUILD_MAP, GET_ITEM,
+    GET_ATTR, SET_ATTR, JUMP, POP_JUMP_IF_FALSE, MAKE_FUNCTION, MAKE_CLASS,
+    CALL, RETURN, TAIL_CALL, JUMP_IF_FALSE_OR_POP,
+    JUMP_IF_TRUE_OR_POP, BUILD_ARRAY, GET_ITER,
+    FOR_ITER) = range(len(opnames))
+
+operators = tuple(binary_operators.values())
+operator_index = {op: index for index, op in enumerate(binary_operators)}
+
+class CodeObj(object):
+    def __init__(self, name, params) -> None:
+        self.name = name
+        self.params = params
+        self.code = array('i')
+        self.consts = []
+        self.names = []
+        self.caches = []  # inline caches of GET_ATTR
+        self._index = {} # (type, const) or name -> index
+
+    def emit(self, op, arg=0):
+        self.code.extend((op, arg))
+        return len(self.code) - 1 # offset of the argument, for patching
+
+    def patch(self, at, target):
+        self.code[at] = target
+
+    @property
+    def offset(self):
+        return len(self.code)
+
+    def add_const(self, value):
+        if isinstance(value, CodeObj): # every function has its own entry
+            self.consts.append(value)
+            return len(self.consts) - 1
+        key = (type(value), value) # 1 and True must not share an entry
+        if key not in self._index:
+            self._index[key] = len(self.consts)
+            self.consts.append(value)
+        return self._index[key]
+
+    def add_cache(self, attr):
+        self.caches.append(AttrCache(attr))
+        return len(self.caches) - 1
+
+    def add_name(self, name):
+        if name not in self._index:
+            self._index[name] = len(self.names)
+            self.names.append(name)
+        return self._index[name]
+
+
+def compile(ast, name='<main>', params=()):
+    code = CodeObj(name, list(params))
+
+    def binop(node):
+        if node.op in ('&&', '||'): # the right side only when needed
+            expr(node.left)
+            to_end = code.emit(JUMP_IF_FALSE_OR_POP if node.op == '&&'
+                else JUMP_IF_TRUE_OR_POP)
+            expr(node.right)
+            code.patch(to_end, code.offset)
+            return
+        if node.op not in operator_index:
+            raise Exception('Unknown operator: ' + node.op)
+        expr(node.left)
+        expr(node.right)
+        code.emit(BINARY_OP, operator_index[node.op])
+
+    def number(node):
+        code.emit(LOAD_CONST, code.add_const(int(node.value)))
+
+    def string(node):
+        code.emit(LOAD_CONST, code.add_const(node.value))
+
+    def null(node):
+        code.emit(LOAD_CONST, code.add_const(None))
+
+    def map(node):
+        for key, value in node.body.items():
+            expr(key)
+            expr(value)
+        code.emit(BUILD_MAP, len(node.body))
+
+    def array(node):
+        for item in node.body:
+            expr(item)
+        code.emit(BUILD_ARRAY, len(node.body))
+
+    def getitem(node):
+        expr(node.container)
+        expr(node.index)
+        code.emit(GET_ITEM)
+
+    def block(node):
+        *head, last = node.body
+        for stmt in head:
+            statement(stmt)
+        expr(last) # value of block is the value of last statement
+
+    def ifstmt(node):
+        expr(node.cond)
+        to_else = code.emit(POP_JUMP_IF_FALSE)
+        expr(node.body)
+        to_end = code.emit(JUMP)
+        code.patch(to_else, code.offset)
+        if node.else_body is not None:
+            expr(node.else_body)
+        else:
+            null(node)
+        code.patch(to_end, code.offset)
+
+    def whilestmt(node):
+        start = code.offset
+        expr(node.cond)
+        to_end = code.emit(POP_JUMP_IF_FALSE)
+        for stmt in node.body.body:
+            statement(stmt)
+        code.emit(JUMP, start)
+        code.patch(to_end, code.offset)
+
+    def forstmt(node):
+        expr(node.iterable)
+        code.emit(GET_ITER)
+        start = code.offset
+        to_end = code.emit(FOR_ITER)
+        code.emit(STORE_NAME, code.add_name(node.name))
+        for stmt in node.body.body:
+            statement(stmt)
+        code.emit(JUMP, start)
+        code.patch(to_end, code.offset)
+
+    def defvar(node):
+        expr(node.value)
+        code.emit(STORE_NAME, code.add_name(node.name))
+
+    def getvar(node):
+        code.emit(LOAD_NAME, code.add_name(node.name))
+
+    def function(node):
+        func = compile(node.body, node.name, node.params.body)
+        code.emit(MAKE_FUNCTION, code.add_const(func))
+
+    def defunc(node):
+        function(node)
+        code.emit(STORE_NAME, code.add_name(node.name))
+
+    def call(node):
+        expr(node.func)
+        for arg in node.args.body:
+            expr(arg)
+        code.emit(CALL, len(node.args.body))
+
+    def defcls(node):
+        for attr in node.body:
+            code.emit(LOAD_CONST, code.add_const(attr.name))
+            if isinstance(attr, parser.Defunc):
+                function(attr)
+            elif isinstance(attr, parser.SetVar):
+                expr(attr.value)
+            else:
+                raise Exception(f'Unknown attribute type: {attr}')
+        code.emit(LOAD_CONST, code.add_const(node.name))
+        code.emit(MAKE_CLASS, len(node.body))
+        code.emit(STORE_NAME, code.add_name(node.name))
+
+    def setattr(node):
+        expr(node.obj)
+        expr(node.value)
+        code.emit(SET_ATTR, code.add_name(node.attr))
+
+    def getattr(node):
+        expr(node.obj)
+        code.emit(GET_ATTR, code.add_cache(node.attr))
+
+    # Statements only run for their side effect and leave nothing on
+    # the stack, expressions push exactly one value
+    void_node = (parser.SetVar, parser.Defunc, parser.DefCls, parser.SetAttr,
+        parser.WhileStmt, parser.ForStmt)
+
+    def statement(node):
+        node_to_compiler[type(node)](node)
+        if not isinstance(node, void_node):
+            code.emit(POP_TOP)
+
+    def expr(node):
+        node_to_compiler[type(node)](node)
+        if isinstance(node, void_node):
+            null(node)
+
+    node_to_compiler = {
+        parser.Number: number,
+        parser.String: string,
+        parser.Null: null,
+        parser.BinOp: binop,
+        parser.Block: block,
+        parser.IfStmt: ifstmt,
+        parser.WhileStmt: whilestmt,
+        parser.ForStmt: forstmt,
+        parser.Map: map,
+        parser.Array: array,
+        parser.GetItem: getitem,
+        parser.SetVar: defvar,
+        parser.GetVar: getvar,
+        parser.Defunc: defunc,
+        parser.Call: call,
+        parser.DefCls: defcls,
+        parser.SetAttr: setattr,
+        parser.GetAttr: getattr,
+    }
+
+    expr(ast)
+    code.emit(RETURN)
+    tail_calls(code)
+    return code
+
+# A CALL followed by RETURN, directly or through JUMPs (the end of an if
+# branch), is in tail position: its frame is not needed after it
+def tail_calls(code):
+    instrs = code.code
+    for offset in range(0, len(instrs), 2):
+        if instrs[offset] != CALL:
+            continue
+        target = offset + 2
+        while instrs[target] == JUMP:
+            target = instrs[target + 1]
+        if instrs[target] == RETURN:
+            instrs[offset] = TAIL_CALL
+
+
+def disassemble(code):
+    ops = list(binary_operators)
+    lines = [f'Disassembly of {code.name}({", ".join(code.params)}):']
+    nested = []
+    for offset in range(0, len(code.code), 2):
+        op, arg = code.code[offset], code.code[offset + 1]
+        if op in (LOAD_CONST, MAKE_FUNCTION):
+            value = code.consts[arg]
+            if isinstance(value, CodeObj):
+                nested.append(value)
+                detail = f'<code {value.name}>'
+            else:
+                detail = repr(value)
+        elif op in (LOAD_NAME, STORE_NAME, SET_ATTR):
+            detail = code.names[arg]
+        elif op == GET_ATTR:
+            detail = code.caches[arg].attr
+        elif op == BINARY_OP:
+            detail = ops[arg]
+        elif op in (JUMP, POP_JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP,
+                JUMP_IF_TRUE_OR_POP, FOR_ITER):
+            detail = f'to {arg}'
+        elif op in (BUILD_MAP, BUILD_ARRAY, MAKE_CLASS, CALL, TAIL_CALL):
+            detail = f'count {arg}'
+        else:
+            lines.append(f'{offset:6} {opnames[op]}')
+            continue
+        lines.append(f'{offset:6} {opnames[op]:<20}{arg:<5}({detail})')
+
+    for func in nested:
+        lines.append('')
+        lines.append(disassemble(func))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print('Test bytecode')
+
+    from lexer import my_lexer
+    from parser import my_parser
+
+    my_lexer = my_lexer()
+    # Build the parser
+    my_parser = my_parser()
+
+    source_file = "test.py"
+    data = open(source_file, 'r').read()
+
+    ast = my_parser.parse(data)
+
+    print(disassemble(compile(ast)))
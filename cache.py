@@ -0,0 +1,49 @@
+#! /bin/env python3
+
+# Directory for generated files kept between runs (lexer/parser tables).
+#
+# Set INTERPRETER_CACHE_DIR to move it, by default it is
+# $XDG_CACHE_HOME/python-interpreter (~/.cache/python-interpreter).
+# Files are named after grammar_version(), so editing lexer.py/parser.py,
+# the hand written fastlexer.py/pratt.py (or upgrading ply) gives new
+# files instead of using stale ones.
+
+import functools
+import hashlib
+import importlib.util
+import os
+
+import ply
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def cache_dir(path=None):
+    if path is None:
+        path = os.environ.get('INTERPRETER_CACHE_DIR')
+    if path is None:
+        base = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+        path = os.path.join(base, 'python-interpreter')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+@functools.lru_cache(maxsize=None)
+def grammar_version():
+    digest = hashlib.sha256(ply.__version__.encode())
+    for name in ('lexer.py', 'parser.py', 'fastlexer.py', 'pratt.py'):
+        with open(os.path.join(SOURCE_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# Import the generated module `name` from directory, None if not there
+def load_module(directory, name):
+    path = os.path.join(directory, name + '.py')
+    if not os.path.exists(path):
+        return None
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception: # truncated or corrupt file, build it again
+        return None
+    return module
@@ -0,0 +1,309 @@
+#! /bin/env python3
+
+# Closure compiler: walk the ast once and turn every node into a python
+# closure with its children and operator already bound, then just call
+# the closure of the root node to run the program.
+#
+# Variables are resolved ahead of time by resolver.py, every compiled
+# closure takes the display of the frames it runs in:
+#   ({global variables}, [slots of outermost function], ..., [own slots])
+# so a variable of any enclosing function is a single index away.
+
+import parser
+from arrays import make_array
+from interpreter import FuncObj, ClsObj, AttrCache, binary_operators, \
+    set_attr, new_cls, init_env
+from memo import Memo, pure_functions
+from resolver import resolve
+
+# Slot of a variable not assigned yet
+UNSET = object()
+
+# memo: a memo.Memo caching the calls of pure functions, True for a new
+# one, False (the default) to turn memoization off
+def closure_interpreter(ast, memo=False):
+    def binop(node):
+        left = compile(node.left)
+        right = compile(node.right)
+        if node.op == '&&':
+            return lambda scope: left(scope) and right(scope)
+        if node.op == '||':
+            return lambda scope: left(scope) or right(scope)
+        if node.op not in binary_operators:
+            raise Exception('Unknown operator: ' + node.op)
+        op = binary_operators[node.op]
+        return lambda scope: op(left(scope), right(scope))
+
+    def number(node):
+        value = int(node.value)
+        return lambda scope: value
+
+    def string(node):
+        value = node.value
+        return lambda scope: value
+
+    def null(node):
+        return lambda scope: None
+
+    def map(node):
+        items = [ (compile(key), compile(value))
+            for key, value in node.body.items() ]
+        return lambda scope: {key(scope):value(scope) \
+            for key, value in items}
+
+    def array(node):
+        items = [ compile(item) for item in node.body ]
+        return lambda scope: make_array([item(scope) for item in items])
+
+    def getitem(node):
+        container = compile(node.container)
+        index = compile(node.index)
+        return lambda scope: container(scope)[index(scope)]
+
+    def block(node):
+        stmts = [ compile(stmt) for stmt in node.body ]
+        if len(stmts) == 1:
+            return stmts[0]
+        *head, last = stmts
+        def run(scope):
+            for stmt in head:
+                stmt(scope)
+            return last(scope) # return last value of block
+        return run
+
+    def ifstmt(node):
+        cond = compile(node.cond)
+        body = compile(node.body)
+        if node.else_body is None:
+            def run(scope):
+                if cond(scope):
+                    return body(scope)
+            return run
+
+        else_body = compile(node.else_body)
+        def run(scope):
+            if cond(scope):
+                return body(scope)
+            return else_body(scope)
+        return run
+
+    def whilestmt(node):
+        cond = compile(node.cond)
+        stmts = [ compile(stmt) for stmt in node.body.body ]
+        if len(stmts) == 1:
+            [stmt] = stmts
+            def run(scope):
+                while cond(scope):
+                    stmt(scope)
+            return run
+
+        def run(scope):
+            while cond(scope):
+                for stmt in stmts:
+                    stmt(scope)
+        return run
+
+    def forstmt(node):
+        iterable = compile(node.iterable)
+        stmts = [ compile(stmt) for stmt in node.body.body ]
+        store = binder(node)
+        def run(scope):
+            for value in iterable(scope):
+                store(scope, value)
+                for stmt in stmts:
+                    stmt(scope)
+        return run
+
+    def defvar(node):
+        value = compile(node.value)
+        store = binder(node)
+        return lambda scope: store(scope, value(scope))
+
+    def getvar(node):
+        name = node.name
+
+        def global_var(scope):
+            if name in scope[0]:
+                return scope[0][name]
+            raise Exception(f'Variable not found: {name}')
+
+        addresses = [ (depth - hops, slot)
+            for hops, slot in resolution.addresses[node] ]
+        if not addresses:
+            return global_var
+
+        if len(addresses) == 1:
+            [(level, slot)] = addresses
+            def run(scope):
+                value = scope[level][slot]
+                if value is UNSET:
+                    return global_var(scope)
+                return value
+            return run
+
+        def run(scope):
+            for level, slot in addresses:
+                value = scope[level][slot]
+                if value is not UNSET:
+                    return value
+            return global_var(scope)
+        return run
+
+    def binder(node):
+        # Store into own frame, or the global variables at top level
+        if node in resolution.slots:
+            slot = resolution.slots[node]
+            def store(scope, value):
+                scope[-1][slot] = value
+        else:
+            name = node.name
+            def store(scope, value):
+                scope[0][name] = value
+        return store
+
+    def function(node):
+        nonlocal depth
+        name = node.name
+        params = node.params.body # [ param...] list of strings
+        size, param_slots = resolution.frames[node]
+
+        depth += 1
+        body = compile(node.body)
+        depth -= 1
+
+        def enter(scope, args):
+            slots = [UNSET] * size
+            for slot, value in zip(param_slots, args):
+                slots[slot] = value
+            return body(scope + (slots,))
+
+        if node in pure:
+            def make_pure(scope):
+                func = FuncObj(name, params, enter, scope)
+                func.flag |= FuncObj.Flag.MEMO
+                return func
+            return make_pure
+        return lambda scope: FuncObj(name, params, enter, scope)
+
+    def defunc(node):
+        make_func = function(node)
+        store = binder(node)
+        return lambda scope: store(scope, make_func(scope))
+
+    def call(node):
+        func = compile(node.func)
+        args = [ compile(arg) for arg in node.args.body ]
+        return lambda scope: apply(func(scope), [arg(scope) for arg in args])
+
+    def defcls(node):
+        name = node.name
+        attrs = []
+        for attr in node.body:
+            if isinstance(attr, parser.Defunc):
+                attrs.append((attr.name, function(attr)))
+            elif isinstance(attr, parser.SetVar):
+                attrs.append((attr.name, compile(attr.value)))
+            else:
+                raise Exception(f'Unknown attribute type: {attr}')
+        store = binder(node)
+
+        def run(scope):
+            cls_dict = { attr_name: value(scope)
+                for attr_name, value in attrs }
+            store(scope, new_cls(env.metacls, name, None, cls_dict))
+        return run
+
+    def setattr(node):
+        obj = compile(node.obj)
+        attr = node.attr
+        value = compile(node.value)
+        def run(scope):
+            target = obj(scope)
+            set_attr(target, attr, value(scope))
+        return run
+
+    def getattr(node):
+        obj = compile(node.obj)
+        cache = AttrCache(node.attr)
+        return lambda scope: cache.get(obj(scope))
+
+    def apply(func, args):
+        if isinstance(func, ClsObj):
+            cls = func.dict['cls']
+            if 'call' not in cls.dict:
+                raise Exception(f'Class {func.name} has no call method')
+            args.insert(0, func)
+            func = cls.dict['call']
+
+        if not isinstance(func, FuncObj):
+            raise Exception(f'{func} is not a function')
+
+        if func.flag & FuncObj.Flag.BOUNDED:
+            args.insert(0, func.obj)
+
+        if func.flag & FuncObj.Flag.BUILTIN:
+            return func.body(*args)
+
+        params = func.params
+        if len(args) != len(params):
+            raise Exception(f'{func.name} expected {len(params)} args, \
+                but got {len(args)}')
+
+        if func.flag & FuncObj.Flag.MEMO and memo:
+            return memo.call(func, args, enter)
+        return func.body(func.scope, args)
+
+    def enter(func, args):
+        return func.body(func.scope, args)
+
+    node_to_compiler = {
+        parser.Number: number,
+        parser.String: string,
+        parser.Null: null,
+        parser.BinOp: binop,
+        parser.Block: block,
+        parser.IfStmt: ifstmt,
+        parser.WhileStmt: whilestmt,
+        parser.ForStmt: forstmt,
+        parser.Map: map,
+        parser.Array: array,
+        parser.GetItem: getitem,
+        parser.SetVar: defvar,
+        parser.GetVar: getvar,
+        parser.Defunc: defunc,
+        parser.Call: call,
+        parser.DefCls: defcls,
+        parser.SetAttr: setattr,
+        parser.GetAttr: getattr,
+    }
+
+    def compile(node):
+        return node_to_compiler[type(node)](node)
+
+    if memo is True:
+        memo = Memo()
+    pure = pure_functions(ast) if memo else ()
+    resolution = resolve(ast)
+    depth = 0 # number of functions enclosing the node being compiled
+    env = init_env(apply)
+    program = compile(ast)
+
+    return program((env.global_scope[1],))
+
+
+if __name__ == '__main__':
+    print('Test closure interpreter')
+
+    from lexer import my_lexer
+    from parser import my_parser
+
+    my_lexer = my_lexer()
+    # Build the parser
+    my_parser = my_parser()
+
+    source_file = "test.py"
+    data = open(source_file, 'r').read()
+
+    ast = my_parser.parse(data)
+
+    result = closure_interpreter(ast)
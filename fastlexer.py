@@ -0,0 +1,167 @@
+#! /bin/env python3
+
+# Hand written lexer of the tokens of lexer.py, a drop-in for my_lexer().
+#
+# tokenize(data) makes a single pass of one regex over the input (findall)
+# and keeps the tokens in an array of kinds and a list of their texts,
+# classified by map() over dicts: no object and no python code per token.
+# FastLexer puts ply's interface on it (input(), token(), iteration,
+# lineno, clone()), so the parser can use it:
+#
+#   my_parser().parse(data, lexer=fast_lexer())
+#
+# Same tokens, values, lineno and lexpos as ply: newlines only count
+# outside strings and comments, keywords are IDENTIFIERs found in reserved,
+# an illegal character is printed and skipped.
+
+from array import array
+from itertools import compress, repeat
+from operator import itemgetter
+import re
+
+from lexer import tokens, literals, reserved, string_pattern, \
+    comment_pattern
+
+# Token types by kind, the number kept in Tokens.kinds
+types = tokens + tuple(literals)
+kind_of = {type: kind for kind, type in enumerate(types)}
+NUMBER = kind_of['NUMBER']
+STRING = kind_of['STRING']
+IDENTIFIER = kind_of['IDENTIFIER']
+COMMENT = 254 # not a token, kept for token() to find the positions
+ILLEGAL = 255
+
+# Kind of a text: keywords, operators, literals, a lone quote
+text_kinds = {word: kind_of[type] for word, type in reserved.items()}
+text_kinds.update({'||': kind_of['OR'], '==': kind_of['EQ'],
+    '!=': kind_of['NE'], '&&': kind_of['AND']})
+text_kinds.update((char, kind_of[char]) for char in literals)
+text_kinds.update({'"': ILLEGAL, "'": ILLEGAL})
+# Kind of any other text, by its first character
+first_kinds = dict.fromkeys('0123456789', NUMBER)
+first_kinds.update(dict.fromkeys('abcdefghijklmnopqrstuvwxyz'
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ_', IDENTIFIER))
+first_kinds.update({'"': STRING, "'": STRING, '/': COMMENT, '#': COMMENT})
+
+# The rules in the order of ply's master regex, then literals. Spaces,
+# tabs and newlines are never matched: findall skips them
+PIECES = re.compile('|'.join((
+    r'\d+',
+    r'[a-zA-Z_][a-zA-Z_0-9]*',
+    string_pattern,
+    comment_pattern,
+    r'\|\||==|!=|&&',
+    r'[^ \t\n]', # literals and illegal characters
+)))
+
+class Tokens(object):
+    __slots__ = ('data', 'kinds', 'texts')
+
+    def __init__(self, data, kinds, texts) -> None:
+        self.data = data
+        self.kinds = kinds # array of the index in types, or COMMENT
+        self.texts = texts # text of each one, in the order of data
+
+    def __len__(self):
+        return len(self.kinds)
+
+def tokenize(data):
+    texts = PIECES.findall(data)
+    kinds = bytes(map(text_kinds.get, texts, map(first_kinds.get,
+        map(itemgetter(0), texts), repeat(ILLEGAL))))
+    if ILLEGAL in kinds:
+        kinds, texts = drop_illegal(kinds, texts)
+    return Tokens(data, array('B', kinds), texts)
+
+def drop_illegal(kinds, texts):
+    kinds = bytearray(kinds)
+    for index, kind in enumerate(kinds):
+        if kind != ILLEGAL:
+            continue
+        if texts[index].isdecimal(): # \d+ of other scripts
+            kinds[index] = NUMBER
+        else:
+            print("Illegal character '%s'" % texts[index])
+    keep = bytes(kind != ILLEGAL for kind in kinds)
+    return bytes(compress(kinds, keep)), list(compress(texts, keep))
+
+# What token() gives, ply's LexToken
+class Token(object):
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, type, value, lineno, lexpos) -> None:
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return f'LexToken({self.type},{self.value!r},{self.lineno},' \
+            f'{self.lexpos})'
+
+class FastLexer(object):
+    def __init__(self) -> None:
+        self.lineno = 1 # line of the next input(), as in ply
+        self.lexdata = ''
+        self.tokens = Tokens('', array('B'), [])
+        self.index = 0
+        self.lexpos = 0 # end of the last token
+
+    # tokens: tokenize(data) if already made
+    def input(self, data, tokens=None):
+        self.lexdata = data
+        self.tokens = tokenize(data) if tokens is None else tokens
+        self.index = 0
+        self.lexpos = 0
+
+    # Only whitespace is between two texts: the next text is the first one
+    # found after the last, the newlines in between are the lines it moved
+    def token(self):
+        tokens = self.tokens
+        data = tokens.data
+        kinds = tokens.kinds
+        index = self.index
+        end = self.lexpos
+        kind = COMMENT
+        while kind == COMMENT:
+            if index == len(kinds):
+                self.lineno += data.count('\n', end)
+                self.lexpos = len(data)
+                return None
+            kind = kinds[index]
+            text = tokens.texts[index]
+            index += 1
+            position = data.find(text, end)
+            self.lineno += data.count('\n', end, position)
+            end = position + len(text)
+        self.index = index
+        self.lexpos = end
+        return Token(types[kind], int(text) if kind == NUMBER else text,
+            self.lineno, position)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = self.token()
+        if token is None:
+            raise StopIteration
+        return token
+
+    def clone(self):
+        lexer = FastLexer()
+        lexer.lineno = self.lineno
+        return lexer
+
+def fast_lexer():
+    return FastLexer()
+
+
+if __name__ == '__main__':
+    print('Test fastlexer')
+
+    lexer = fast_lexer()
+    lexer.input('''
+    33 +  if 4( =else} +{ 5 "adgasd"
+    ''')
+    print([(tok.value, tok.type) for tok in lexer])
@@ -1,103 +1,119 @@
 #! /bin/env python3
 
-from pyecharts.charts import Tree
+# Views of an ast which stay usable for tens of thousands of nodes.
+#
+# export(ast, out) writes it as JSON lines while walking it, one line per
+# node, cut at a maximum depth and a maximum number of children per node:
+# a summary line stands for what is left out.
+#
+# inspector(ast) renders ast.html, a pyecharts tree of the first
+# chunk_size items. The rest is written in chunks to ast.chunks/, the
+# page loads a chunk when its lazy item ('... (+n)' or '... n more') is
+# clicked. The chunks are scripts: that works from file:// too.
+#
+# inspector(ast, profile=profiler), after interpreter(ast, profiler=
+# profiler) with a profiler.Profiler(sites=True), draws a heat map: nodes
+# are coloured from blue to red and sized by their inclusive time, and
+# labelled with their number of runs and that time.
+
+from collections import deque
+import json
+import os
+import shutil
 
 import parser
 
-def inspector(ast):
-    def binop(node, chart_tree):
-        chart_tree['name'] = f'BinOp({node.op})'
-        chart_tree['children'] = [ walk(n,{}) for n in [node.left, node.right] ]
-        return chart_tree
-
-    def number(node, chart_tree):
-        chart_tree['name'] = str(node.value)
-        return chart_tree
-
-    def string(node, chart_tree):
-        chart_tree['name'] = f'"{node.value}"'
-        return chart_tree
-
-    def null(node, chart_tree):
-        chart_tree['name'] = 'Null'
-        return chart_tree
-
-    def map(node, chart_tree):
-        chart_tree['name'] = 'Map'
-        chart_tree['children'] = [ { 'children':[ walk(key, {}), walk(value, {})] } 
-            for key, value in node.body.items() ]
-        return chart_tree
-
-    def getitem(node, chart_tree):
-        chart_tree['name'] = '[]'
-        chart_tree['children'] = [ walk(node.container, {}), walk(node.index, {}) ]
-        return chart_tree
-
-    def block(node, chart_tree):
-        chart_tree['name'] = 'Block'
-        chart_tree['children'] = [ walk(stmt, {}) for stmt in node.body ]
-        return chart_tree
-
-    def ifstmt(node, chart_tree):
-        chart_tree['name'] = 'If'
-        chart_tree['children'] = [ walk(node.cond, {}), walk(node.body, {}) ]
-        if node.else_body:
-            chart_tree['children'].append(walk(node.else_body, {}))
-        return chart_tree
-
-    def setvar(node, chart_tree):
-        chart_tree['name'] = f'{node.name}(=)'
-        chart_tree['children'] = [ walk(node.value, {}) ]
-        return chart_tree
-
-    def getvar(node, chart_tree):
-        chart_tree['name'] = node.name
-        return chart_tree
-
-    def paramlist(node, chart_tree):
-        chart_tree['name'] = 'Params'
-        chart_tree['children'] = [ {'name':param} for param in node.body ]
-        return chart_tree
-
-    def defunc(node, chart_tree):
-        chart_tree['name'] = f'Defunc({node.name})'
-        chart_tree['children'] = [ walk(node.params, {}), walk(node.body, {}) ]
-        return chart_tree
-
-    def arglist(node,chart_tree):
-        chart_tree['name'] = 'Args()'
-        chart_tree['children'] = [ walk(arg, {}) for arg in node.body ]
-        return chart_tree
-
-    def call(node, chart_tree):
-        chart_tree['name'] = 'Call()'
-        chart_tree['children'] = [ walk(node.func, {}), walk(node.args, {}) ]
-        return chart_tree
-
-    def defcls(node, chart_tree):
-        chart_tree['name'] = f'Class({node.name})'
-        chart_tree['children'] = [ walk(n, {}) for n in node.body ]
-        return chart_tree
-
-    def setattr(node, chart_tree):
-        chart_tree['name'] = f'(.{node.attr}=)'
-        chart_tree['children'] = [ walk(node.obj, {}),  walk(node.value, {}) ]
-        return chart_tree
-
-    def getattr(node, chart_tree):
-        chart_tree['name'] = 'Get(.)'
-        chart_tree['children'] = [ walk(node.obj, {}), {'name':node.attr} ]
-        return chart_tree
-
-    node_to_method = {
+# A tree item which is not an ast node: a map entry or a parameter
+class Item(object):
+    __slots__ = ('name', 'children')
+
+    def __init__(self, name, children=()) -> None:
+        self.name = name
+        self.children = children
+
+# node type -> describe(node), the (name, children) of the node
+def describers():
+    def binop(node):
+        return f'BinOp({node.op})', (node.left, node.right)
+
+    def number(node):
+        return str(node.value), ()
+
+    def string(node):
+        return f'"{node.value}"', ()
+
+    def null(node):
+        return 'Null', ()
+
+    def map(node):
+        return 'Map', [Item('', (key, value))
+            for key, value in node.body.items()]
+
+    def array(node):
+        return '[...]', node.body
+
+    def getitem(node):
+        return '[]', (node.container, node.index)
+
+    def block(node):
+        return 'Block', node.body
+
+    def ifstmt(node):
+        if node.else_body is None:
+            return 'If', (node.cond, node.body)
+        return 'If', (node.cond, node.body, node.else_body)
+
+    def whilestmt(node):
+        return 'While', (node.cond, node.body)
+
+    def forstmt(node):
+        return f'For({node.name})', (node.iterable, node.body)
+
+    def setvar(node):
+        return f'{node.name}(=)', (node.value,)
+
+    def getvar(node):
+        return node.name, ()
+
+    def paramlist(node):
+        return 'Params', [Item(param) for param in node.body]
+
+    def defunc(node):
+        return f'Defunc({node.name})', (node.params, node.body)
+
+    def arglist(node):
+        return 'Args()', node.body
+
+    def call(node):
+        return 'Call()', (node.func, node.args)
+
+    def defcls(node):
+        return f'Class({node.name})', node.body
+
+    def setattr(node):
+        return f'(.{node.attr}=)', (node.obj, node.value)
+
+    def getattr(node):
+        return 'Get(.)', (node.obj, Item(node.attr))
+
+    def item(node):
+        return node.name, node.children
+
+    def empty(node): # the ';' statement
+        return node, ()
+
+    return {
         parser.BinOp: binop,
         parser.Number: number,
         parser.String: string,
         parser.Null: null,
         parser.Map: map,
+        parser.Array: array,
         parser.GetItem: getitem,
         parser.Block: block,
         parser.IfStmt: ifstmt,
+        parser.WhileStmt: whilestmt,
+        parser.ForStmt: forstmt,
         parser.SetVar: setvar,
         parser.GetVar: getvar,
         parser.ParamList: paramlist,
@@ -107,17 +123,242 @@ def inspector(ast):
         parser.DefCls: defcls,
         parser.SetAttr: setattr,
         parser.GetAttr: getattr,
-     }
+        Item: item,
+        str: empty,
+    }
+
+node_to_describe = describers()
+
+# (name, children) of a node
+def describe(node):
+    return node_to_describe[type(node)](node)
+
+# Number of items in the subtree of every ast node, by id. Walks with a
+# stack: deep trees don't hit the recursion limit
+def subtree_sizes(ast):
+    sizes = {}
+    order = [] # [(node, children)] parents first
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        children = describe(node)[1]
+        order.append((node, children))
+        stack.extend(children)
+    for node, children in reversed(order):
+        sizes[id(node)] = 1 + sum([sizes[id(child)] for child in children])
+    return sizes
+
+# Items (not ast nodes) are made again by every describe(), their sizes
+# are not kept
+def size_of(node, sizes):
+    if isinstance(node, parser.AstNode):
+        return sizes[id(node)]
+    return 1 + sum(size_of(child, sizes) for child in describe(node)[1])
+
+# Write the ast to out as JSON lines, depth first:
+#   {"id": 3, "parent": 1, "name": "BinOp(+)"}
+# The children of a node at max_depth, and the ones past max_children of
+# a node, are left out for one line summing them up:
+#   {"id": 9, "parent": 3, "elided": 40, "nodes": 1234}
+# (40 children, 1234 items in their subtrees). Returns the number of lines.
+def export(ast, out, max_depth=None, max_children=None):
+    # for the summaries
+    sizes = None if max_depth is None and max_children is None else \
+        subtree_sizes(ast)
+    count = 0
+    stack = [(ast, 'null', 0)] # (node, parent id, depth)
+    while stack:
+        node, parent, depth = stack.pop()
+        name, children = describe(node)
+        out.write(f'{{"id": {count}, "parent": {parent}, '
+            f'"name": {json.dumps(name, ensure_ascii=False)}}}\n')
+        parent = count
+        count += 1
+
+        kept = children
+        if max_depth is not None and depth >= max_depth:
+            kept = ()
+        elif max_children is not None:
+            kept = children[:max_children]
+        if len(kept) < len(children):
+            elided = children[len(kept):]
+            nodes = sum(size_of(child, sizes) for child in elided)
+            out.write(f'{{"id": {count}, "parent": {parent}, '
+                f'"elided": {len(elided)}, "nodes": {nodes}}}\n')
+            count += 1
+        stack.extend((child, parent, depth + 1) for child in reversed(kept))
+    return count
+
+# The page side of the lazy items: their value is the number of the chunk
+# with what they stand for, in file number / CHUNKS_PER_FILE. A '... n
+# more' item (more: true) is replaced by its chunk, any other gets it as
+# children.
+CHUNKS_PER_FILE = 16
+
+LOAD_CHUNKS = '''
+var astItems = null;  // chunk number -> [item, parent item]
+var astLoaded = {};   // chunk number -> children, loaded with another one
+function astIndex(item, parent) {
+    if (item.value !== undefined) astItems[item.value] = [item, parent];
+    (item.children || []).forEach(function (child) { astIndex(child, item); });
+}
+function astChunk(number, children) {
+    astLoaded[number] = children;
+}
+function astExpand(number) {
+    var found = astItems[number], item = found[0], parent = found[1];
+    var children = astLoaded[number];
+    delete astItems[number];
+    delete astLoaded[number];
+    if (item.more) {
+        children.forEach(function (child) { astIndex(child, parent); });
+        var siblings = parent.children;
+        siblings.splice.apply(siblings,
+            [siblings.indexOf(item), 1].concat(children));
+    } else {
+        children.forEach(function (child) { astIndex(child, item); });
+        delete item.value;
+        item.name = item.name.replace(/ \\(\\+\\d+\\)$/, '');
+        item.children = children;
+    }
+    CHART.setOption({series: [{data: OPTION.series[0].data}]});
+}
+CHART.on('click', function (params) {
+    if (astItems === null) {
+        astItems = {};
+        astIndex(OPTION.series[0].data[0], null);
+    }
+    var number = params.data.value;
+    if (number === undefined || !(number in astItems)) return;
+    if (number in astLoaded) return astExpand(number);
+    var script = document.createElement('script');
+    script.src = DIRECTORY + '/' + Math.floor(number / PER_FILE) + '.js';
+    script.onload = function () { astExpand(number); };
+    document.body.appendChild(script);
+});
+'''
 
-    def walk(node, chart_tree):
-        return node_to_method[type(node)](node, chart_tree)
+# Colour of heat 0..1: blue (cold) to red (hot)
+COLD = (0x5b, 0x8f, 0xf9)
+HOT = (0xe8, 0x45, 0x3c)
+NOT_RUN = '#cccccc'
 
-    data = [ walk(ast, {}) ]
+def heat_color(heat):
+    return '#' + ''.join(f'{round(cold + (hot - cold) * heat):02x}'
+        for cold, hot in zip(COLD, HOT))
 
+# Render ast.html (path) and its chunks of at most chunk_size items, max
+# children per node and per chunk, the other ones in '... n more' items
+def inspector(ast, path='ast.html', chunk_size=500, max_children=50,
+        profile=None):
+    # The chart item of a node, with its heat when profiled. Heat is the
+    # inclusive time against the hottest node but the root, square root
+    # scaled so that the warm nodes still show
+    def item_of(node, name):
+        item = {'name': name}
+        if sites is None:
+            return item
+        site = sites.get(node)
+        if site is None:
+            item['itemStyle'] = {'color': NOT_RUN}
+            return item
+        heat = (site.inclusive / hottest) ** 0.5 if hottest else 0.0
+        heat = min(heat, 1.0)
+        item['name'] = f'{name}\n{site.count}x ' \
+            f'{site.inclusive * 1e3:.3f}ms'
+        item['itemStyle'] = {'color': heat_color(heat)}
+        item['symbolSize'] = round(7 + 17 * heat)
+        return item
+
+    # Chart items of children[start:], breadth first until there are
+    # chunk_size of them. Children left out become lazy items, their
+    # (children, start) appended to pending, its index is the chunk number.
+    def chunk(children, start):
+        queue = deque() # (item, node, its children not added yet)
+        items = []
+        count = add(children, start, items, queue)
+        while queue:
+            item, node, grand = queue.popleft()
+            if count + min(len(grand), max_children + 1) <= chunk_size:
+                item['children'] = []
+                count += add(grand, 0, item['children'], queue)
+            else:
+                item['name'] += f' (+{size_of(node, sizes) - 1})'
+                item['value'] = len(pending)
+                pending.append((grand, 0))
+        return items
+
+    def add(children, start, into, queue):
+        end = start + max_children
+        for child in children[start:end]:
+            name, grand = describe(child)
+            into.append(item_of(child, name))
+            if grand:
+                queue.append((into[-1], child, grand))
+        if len(children) > end:
+            into.append({'name': f'... {len(children) - end} more '
+                f'({rest_size(children, end)} nodes)',
+                'value': len(pending), 'more': True})
+            pending.append((children, end))
+        return len(into)
+
+    # Size of children[start:], one sum per children list
+    def rest_size(children, start):
+        found = suffixes.get(id(children))
+        if found is None:
+            total = 0
+            sums = [0] * (len(children) + 1)
+            for i in range(len(children) - 1, -1, -1):
+                total += size_of(children[i], sizes)
+                sums[i] = total
+            found = suffixes[id(children)] = (children, sums)
+        return found[1][start]
+
+    # pyecharts is slow to import, only pay for it when rendering
+    from pyecharts.charts import Tree
+    from pyecharts import options as opts
+
+    directory = os.path.splitext(path)[0] + '.chunks'
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+
+    sites = None
+    if profile is not None:
+        sites = profile.sites
+        if sites is None:
+            raise Exception('The profile has no sites: Profiler(sites=True)')
+        hottest = max((stats.inclusive for node, stats in sites.items()
+            if node is not ast), default=0.0)
+
+    sizes = subtree_sizes(ast)
+    suffixes = {} # id(children) -> (children, sizes of children[i:])
+    pending = []
+    data = chunk([ast], 0)
+    if pending:
+        os.makedirs(directory)
+
+    # Written one file at a time, chunks append the ones under them
+    number = 0
+    while number < len(pending):
+        end = (number // CHUNKS_PER_FILE + 1) * CHUNKS_PER_FILE
+        with open(os.path.join(directory,
+                f'{number // CHUNKS_PER_FILE}.js'), 'w') as f:
+            while number < min(end, len(pending)):
+                children, start = pending[number]
+                pending[number] = None
+                items = chunk(children, start)
+                f.write(f'astChunk({number}, {json.dumps(items)});\n')
+                number += 1
+
+    script = LOAD_CHUNKS.replace('CHART', 'chart_ast') \
+        .replace('OPTION', 'option_ast') \
+        .replace('DIRECTORY', json.dumps(os.path.basename(directory))) \
+        .replace('PER_FILE', str(CHUNKS_PER_FILE))
     c = (
-        Tree()
+        Tree(init_opts=opts.InitOpts(chart_id='ast'))
         .add("", data, orient='TB', initial_tree_depth=-1)
-        .render("ast.html")
+        .add_js_funcs(script)
+        .render(path)
     )
 
 if __name__ == '__main__':
@@ -136,4 +377,3 @@ if __name__ == '__main__':
     ast = my_parser.parse(data)
 
     inspector(ast)
-
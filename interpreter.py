@@ -2,52 +2,106 @@
 
 from enum import Enum
 import functools
-from rich import print
+import operator
+import weakref
 
 import parser
+from arrays import make_array, array_builtins
+from memo import Memo, pure_functions
 
 ObjType = Enum('type', ('NUMBER','STRING','ARRAY','MAP','NULL',
-        'FUNCTION','CLASS'))
+        'FUNCTION','CLASS','ITERATOR'))
 
 class MetaObj(object):
-    pass
+    __slots__ = ()
 
 # Just use the python native type -- NUMBER, STRING, ARRAY, NULL, MAP
 # Only FUNCTION and CLASS are implemented specially
 
 class FuncObj(MetaObj):
-    Flag = Enum('Flag', ('BUILTIN','BOUNDED'))
+    __slots__ = ('name', 'params', 'body', 'scope', 'flag', '__weakref__')
+    type = ObjType.FUNCTION
+
+    # Bit flags, test with  func.flag & FuncObj.Flag.BOUNDED
+    class Flag(object):
+        BUILTIN = 1 << 0
+        BOUNDED = 1 << 1
+        MEMO = 1 << 2    # calls go through the memo.Memo cache
+
     def __init__(self, name, params, body, scope):
-        self.type = ObjType.FUNCTION
         self.name = name
         self.params = params
         self.body = body
         self.scope = scope
-        self.flag = []
+        self.flag = 0
 
 class BdFuncObj(FuncObj):
+    __slots__ = ('func', 'obj')
+
     def __init__(self, func, obj):
         super().__init__(func.name, func.params, func.body, func.scope)
+        self.func = func
         self.obj = obj
-        self.flag = func.flag
-        self.flag.append(FuncObj.Flag.BOUNDED)
+        self.flag = func.flag | FuncObj.Flag.BOUNDED
 
 class BtinFuncObj(FuncObj):
+    __slots__ = ()
+
     def __init__(self, name, func):
         super().__init__(name, None, func, None)
-        self.flag.append(FuncObj.Flag.BUILTIN)
+        self.flag = FuncObj.Flag.BUILTIN
 
 class ClsObj(MetaObj):
+    __slots__ = ('name', 'bases', 'dict', 'version', 'method_cache',
+        'bound_methods', 'dependents', '__weakref__')
+    type = ObjType.CLASS
+
     def __init__(self, name, bases, attr) -> None:
-        self.type = ObjType.CLASS
         self.name = name
         self.bases = bases
         self.dict = attr
+        self.version = 0        # changes on every change of dict
+        self.method_cache = {}  # attr -> value found along dict['cls']
+        self.bound_methods = {} # attr -> BdFuncObj bound to this object
+        self.dependents = None  # objects whose method_cache looked in here
+
+    def depend(self, obj):
+        if self.dependents is None:
+            self.dependents = weakref.WeakSet()
+        self.dependents.add(obj)
+
+    # The dict changed: so did the lookups through it of the dependents
+    def invalidate(self):
+        self.version += 1
+        self.method_cache.clear()
+        if self.dependents:
+            for obj in self.dependents:
+                obj.version += 1
+                obj.method_cache.clear()
+
+# Lazy sequence: make() gives a new python iterator over the elements,
+# computed one at a time, so the sequence is never built in memory and
+# can be iterated again
+class IterObj(MetaObj):
+    __slots__ = ('name', 'make')
+    type = ObjType.ITERATOR
+
+    def __init__(self, name, make) -> None:
+        self.name = name
+        self.make = make
+
+    def __iter__(self):
+        return self.make()
+
+    def __repr__(self):
+        return f'<iterator {self.name}>'
 
 
 class Enviroemnt(object):
     def __init__(self) -> None:
         self._scope = [(None, {}), ] # [(parent_scope, {variables}), ]
+        self.metacls = None
+        self.apply = None # apply(func, args) of the engine running in it
 
     @property
     def global_scope(self):
@@ -63,230 +117,536 @@ class Enviroemnt(object):
     def free_scope(self):
         self._scope.pop()
 
+    # The scopes of a function end at the globals it was made in: they are
+    # looked up in the running environment instead, a fork sees its own
     def get_var(self, name):
-        def get_var_helper(name, scope):
+        scope = self.current_scope
+        while scope[0] is not None:
             if name in scope[1]:
                 return scope[1][name]
-            if scope[0]:
-                return get_var_helper(name, scope[0])
-            raise Exception(f'Variable not found: {name}')
-        return get_var_helper(name, self.current_scope)
+            scope = scope[0]
+        variables = self.global_scope[1]
+        if name in variables:
+            return variables[name]
+        raise Exception(f'Variable not found: {name}')
 
     def set_var(self, name, value):
         self.current_scope[1][name] = value
 
-def interpreter(ast):
-    def binop(node):
+    # A new environment with a copy of the global variables and of the
+    # metaclass, new() making classes of the copy. The classes already made
+    # keep the metaclass they were made with
+    def fork(self):
+        env = Enviroemnt()
+        variables = env.global_scope[1]
+        variables.update(self.global_scope[1])
+        if self.metacls is not None:
+            env.metacls = ClsObj('metacls', None, dict(self.metacls.dict))
+            new = variables.get('new')
+            if isinstance(new, BtinFuncObj) and \
+                    getattr(new.body, 'args', None) == (self.metacls,):
+                variables['new'] = new_builtin(env.metacls)
+        env.apply = self.apply
+        return env
+
+# Shared by every execution engine (tree walker, closure compiler, ...)
+
+binary_operators = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '&&': lambda left, right: left and right,
+    '||': lambda left, right: left or right,
+}
+
+# Quickening of BinOp sites in the tree walker: after QUICKEN_AFTER runs
+# with the same operand types, among specialized_types, a site gets a
+# fast path for them
+QUICKEN_AFTER = 8
+specialized_types = {(int, int), (str, str), (int, str), (str, int)}
+binop_stats = {'specialized': 0, 'generic': 0, 'deoptimized': 0}
+
+# A BinOp site resolves its operator once, watches the operand types
+# of its first runs, then rewrites itself (node.cache) into a fast path
+# for the types seen. The fast path checks the types and falls back
+# for good to the generic path when they change. They are given the eval
+# of the interpreter running them: an ast can be run by several.
+def quicken(node):
+    op = node.op
+    if op == '&&':
+        return lambda node, eval: eval(node.left) and eval(node.right)
+    if op == '||':
+        return lambda node, eval: eval(node.left) or eval(node.right)
+    if op not in binary_operators:
+        raise Exception('Unknown operator: ' + op)
+    func = binary_operators[op]
+    seen = set()
+    runs = 0
+
+    def generic(node, eval):
+        return func(eval(node.left), eval(node.right))
+
+    def deoptimize(node, left, right):
+        binop_stats['deoptimized'] += 1
+        node.cache = generic
+        return func(left, right)
+
+    def specialize(left_type, right_type):
+        binop_stats['specialized'] += 1
+        if isinstance(node.right, parser.Number):
+            # n - 1: bind the literal, don't eval it every time
+            value = int(node.right.value)
+            def constant(node, eval):
+                left = eval(node.left)
+                if type(left) is left_type:
+                    return func(left, value)
+                return deoptimize(node, left, value)
+            return constant
+
+        def fast(node, eval):
+            left = eval(node.left)
+            right = eval(node.right)
+            if type(left) is left_type and type(right) is right_type:
+                return func(left, right)
+            return deoptimize(node, left, right)
+        return fast
+
+    def watch(node, eval):
+        nonlocal runs
         left = eval(node.left)
         right = eval(node.right)
-        op = node.op
-
-        def compute(left, op, right):
-            if op == '+':
-                return left + right
-            elif op == '-':
-                return left - right
-            elif op == '*':
-                return left * right
-            elif op == '/':
-                return left / right
-            elif op == '==':
-                return left == right
-            elif op == '!=':
-                return left != right
-            elif op == '<':
-                return left < right
-            elif op == '>':
-                return left > right
-            elif op == '&&':
-                return left and right
-            elif op == '||':
-                return left or right
+        seen.add((type(left), type(right)))
+        runs += 1
+        if len(seen) > 1:
+            binop_stats['generic'] += 1
+            node.cache = generic
+        elif runs >= QUICKEN_AFTER:
+            types = next(iter(seen))
+            if types in specialized_types:
+                node.cache = specialize(*types)
             else:
-                raise Exception('Unknown operator: ' + op)
-
-        return compute(left, op, right)
-
-    def number(node):
-        return int(node.value)
-
-    def string(node):
-        return node.value
-
-    def null(node):
-        return None
-
-    def map(node):
-        return {eval(key):eval(value) \
-            for key, value in node.body.items()}
-
-    def getitem(node):
-        container = eval(node.container)
-        index = eval(node.index)
-        return container[index]
-
-    def block(node):
-        result = [ eval(stmt) for stmt in node.body ]
-        return result[-1] # return last value of block
-
-    def ifstmt(node):
-        cond = eval(node.cond)
-        if cond:
-            return eval(node.body)
-        elif hasattr(node, 'else_body'):
-            return eval(node.else_body)
-        
-    def defvar(node):
-        value = eval(node.value)
-        env.set_var(node.name, value)
-
-    def getvar(node):
-        return env.get_var(node.name)
-
-    def paramlist(node):
-        return node.body  # [ param...] list of strings
-
-    def defunc(node):
-        # Run when call
-        # params = eval(defun_node.params)
-        # body = eval(defun_node.body)
-
-        func = FuncObj(node.name, node.params, node.body,
-            env.current_scope)
-        env.set_var(node.name, func)
-
-    def arglist(node):
-        return [eval(arg) for arg in node.body]
-
-    def call(node):
-        func = eval(node.func)
-        args = eval(node.args)
-
-        if isinstance(func, ClsObj):
-            cls = func.dict['cls']
-            if 'call' not in cls.dict:
-                raise Exception(f'Class {func.name} has no call method')
-            args.insert(0, func)
-            func = cls.dict['call']
-
-        if not isinstance(func, FuncObj):
-            raise Exception(f'{func} is not a function')
-
-        if FuncObj.Flag.BOUNDED in func.flag:
-            args.insert(0, func.obj)
-
-        if FuncObj.Flag.BUILTIN in func.flag:
-            return func.body(*args)
-
-        params = eval(func.params)
-        if len(args) != len(params):
-            raise Exception(f'{func.name} expected {len(params)} args, \
-                but got {len(args)}')
-
-        env.new_scope(func.scope)
-
-        [env.set_var(name, value)
-            for name, value in zip(params, args)]
-
-        result = eval(func.body)
-        env.free_scope()
-
-        return result
-
-    def defcls(node):
-        name = node.name
-        attrs = {}
-        for attr in node.body:
-            if isinstance(attr, parser.Defunc):
-                func = FuncObj(attr.name, attr.params, attr.body,
-                    env.current_scope)
-                attrs[attr.name] = func
-            elif isinstance(attr, parser.SetVar):
-                value = eval(attr.value)
-                attrs[attr.name] = value
-            else:
-                raise Exception(f'Unknown attribute type: {attr}')
-        
-        cls = new_cls(metacls, name, None, attrs)
-        env.set_var(name, cls)
-
-    def setattr(node):
-        obj = eval(node.obj)
-        attr = node.attr
-        value = eval(node.value)
-
+                binop_stats['generic'] += 1
+                node.cache = generic
+        return func(left, right)
+    return watch
+
+def new_cls(metacls, name, bases, attrs):
+    attrs['cls'] = metacls
+    attrs['dict'] = attrs
+    cls = ClsObj(name, bases, attrs)
+    return cls
+
+# new(name, bases, attrs): a class of metacls
+def new_builtin(metacls):
+    return BtinFuncObj('new', functools.partial(new_cls, metacls))
+
+def meta_new(cls, *args):
+    obj = new_cls(cls, 'N/a', None, {})
+    # obj.init
+    return obj
+
+# Resolve attr along the dict['cls'] chain starting at cls (unbound)
+def lookup_attr(cls, attr):
+    if isinstance(cls, ClsObj) and attr in cls.method_cache:
+        return cls.method_cache[attr]
+
+    chain = []
+    walk = cls
+    while True:
+        if not hasattr(walk, 'dict'):
+           raise Exception(f'{walk} not class')
+        if walk in chain:
+           raise Exception(f'{walk} has a cyclic class chain')
+        chain.append(walk)
+
+        if attr in walk.dict:
+            value = walk.dict[attr]
+            break
+
+        if 'cls' not in walk.dict:
+            raise Exception(f'{walk} has no attribute {attr}')
+        walk = walk.dict['cls']
+
+    cls.method_cache[attr] = value
+    for other in chain[1:]:
+        other.depend(cls)
+    return value
+
+def get_attr(obj, attr):
+    if not hasattr(obj, 'dict'):
+       raise Exception(f'{obj} not class')
+
+    if attr in obj.dict:
+        return obj.dict[attr]
+
+    if 'cls' not in obj.dict:
+        raise Exception(f'{obj} has no attribute {attr}')
+
+    value = lookup_attr(obj.dict['cls'], attr)
+    if not isinstance(value, FuncObj):
+        return value
+    return bind_method(obj, attr, value)
+
+# Functions found in the class are bound to the object
+def bind_method(obj, attr, func):
+    bound = obj.bound_methods.get(attr)
+    if bound is None or bound.func is not func:
+        bound = BdFuncObj(func, obj)
+        obj.bound_methods[attr] = bound
+    return bound
+
+attr_cache_stats = {'hit': 0, 'miss': 0}
+
+# Inline cache of a GetAttr site, keyed on the class of the receiver and
+# the version of that class. Up to `size` classes are kept (polymorphic),
+# after that new classes replace the oldest ones.
+class AttrCache(object):
+    __slots__ = ('attr', 'entries')
+    size = 4
+
+    def __init__(self, attr) -> None:
+        self.attr = attr
+        self.entries = [] # [(cls, version, value, is function), ...]
+
+    def get(self, obj):
+        attr = self.attr
         if not isinstance(obj, ClsObj):
-            raise Exception(f'{obj} is not an object')
-        obj.dict[attr] = value
-
-    def getattr(node):
-        obj = eval(node.obj)
-        attr = node.attr  # identity
-
-        def get_attr(cls, attr):
-            if not hasattr(cls, 'dict'):
-               raise Exception(f'{cls} not class')
-
-            if attr in cls.dict:
-                return cls.dict[attr]
-
-            if 'cls' not in cls.dict:
-                raise Exception(f'{cls} has no attribute {attr}')
-
-            attr = get_attr(cls.dict['cls'], attr)
-            if isinstance(attr, FuncObj):
-                return BdFuncObj(attr, obj)
-            return attr
-
-        return get_attr(obj, attr)
-
-    node_to_computer = {
-        parser.Number: number,
-        parser.String: string,
-        parser.Null: null,
-        parser.BinOp: binop,
-        parser.Block: block,
-        parser.IfStmt: ifstmt,
-        parser.Map: map,
-        parser.GetItem: getitem,
-        parser.SetVar: defvar,
-        parser.GetVar: getvar,
-        parser.ParamList: paramlist,
-        parser.Defunc: defunc,
-        parser.ArgList: arglist,
-        parser.Call: call,
-        parser.DefCls: defcls,
-        parser.SetAttr: setattr,
-        parser.GetAttr: getattr,
-    }
-    
-    def eval(node):
-        return node_to_computer[type(node)](node)
-
-    # def init_env():
+            return get_attr(obj, attr)
+
+        # Attributes of the object itself are never cached
+        if attr in obj.dict:
+            return obj.dict[attr]
+        cls = obj.dict.get('cls')
+        if not isinstance(cls, ClsObj):
+            return get_attr(obj, attr)
+
+        for entry in self.entries:
+            if entry[0] is cls and entry[1] == cls.version:
+                attr_cache_stats['hit'] += 1
+                if entry[3]:
+                    return bind_method(obj, attr, entry[2])
+                return entry[2]
+
+        attr_cache_stats['miss'] += 1
+        value = lookup_attr(cls, attr)
+        is_func = isinstance(value, FuncObj)
+
+        entries = [entry for entry in self.entries if entry[0] is not cls]
+        if len(entries) >= self.size:
+            entries.pop(0)
+        entries.append((cls, cls.version, value, is_func))
+        self.entries = entries
+
+        if is_func:
+            return bind_method(obj, attr, value)
+        return value
+
+def set_attr(obj, attr, value):
+    if not isinstance(obj, ClsObj):
+        raise Exception(f'{obj} is not an object')
+    obj.dict[attr] = value
+    obj.invalidate()
+
+def memoize(func):
+    if not isinstance(func, FuncObj) or func.flag & FuncObj.Flag.BUILTIN:
+        raise Exception(f'{func} is not a user function')
+    func.flag |= FuncObj.Flag.MEMO
+    return func
+
+def nomemo(func):
+    if not isinstance(func, FuncObj):
+        raise Exception(f'{func} is not a function')
+    func.flag &= ~FuncObj.Flag.MEMO
+    return func
+
+def lazy_range(*args):
+    values = range(*args)
+    return IterObj('range', lambda: iter(values))
+
+# Builtins calling function values back, through env.apply of the engine
+# running when the elements are computed
+def iterator_builtins(env):
+    def lazy_map(func, iterable):
+        return IterObj('map', lambda:
+            (env.apply(func, [value]) for value in iterable))
+
+    def lazy_filter(func, iterable):
+        return IterObj('filter', lambda:
+            (value for value in iterable if env.apply(func, [value])))
+
+    return {'range': lazy_range, 'map': lazy_map, 'filter': lazy_filter}
+
+# The print builtin. rich is slow to import, only the scripts printing
+# something load it
+def print(*args):
+    from rich import print
+    print(*args)
+
+def init_env(apply):
     env = Enviroemnt()
+    env.apply = apply
     env.set_var('print', BtinFuncObj('print', print))
 
-    def new_cls(metacls, name, bases, attrs):
-        attrs['cls'] = metacls
-        attrs['dict'] = attrs
-        cls = ClsObj(name, bases, attrs)
-        return cls
-
-    def meta_new(cls, *args):
-        obj = new_cls(cls, 'N/a', None, {}) 
-        # obj.init      
-        return obj
-        
     attr = {'p' : BtinFuncObj('print', print),
         'author' : 'liuqi',
         'call': BtinFuncObj('new', meta_new)}
-    metacls = ClsObj('metacls', None, attr)
-
-    env.set_var('new', BtinFuncObj('new', 
-        functools.partial(new_cls, metacls)))
-
-    return eval(ast)
+    env.metacls = ClsObj('metacls', None, attr)
+
+    env.set_var('new', new_builtin(env.metacls))
+    for name, func in array_builtins.items():
+        env.set_var(name, BtinFuncObj(name, func))
+    for name, func in iterator_builtins(env).items():
+        env.set_var(name, BtinFuncObj(name, func))
+    env.set_var('memoize', BtinFuncObj('memoize', memoize))
+    env.set_var('nomemo', BtinFuncObj('nomemo', nomemo))
+    return env
+
+# Tree walking interpreter keeping its global environment between runs:
+#
+#   session = Interpreter()
+#   session.run(ast)        # the globals it sets are seen by the next runs
+#   snippet = session.fork() # own copy of the globals, same machinery
+#   session.reset()         # back to the builtins only
+#
+# The dispatch table and the computers are built once per Interpreter and
+# shared by its forks. A fork copies the global variables, not the values
+# they hold: maps, arrays and objects are still shared. So are classes:
+# one made before the fork keeps its cls, the parent's metaclass, and
+# A.cls.author = 'x' in the fork changes it for the parent too. The copy
+# of the metaclass a fork or a reset gets is only the cls of the classes
+# made after it.
+#
+# profiler: a profiler.Profiler, wraps the dispatch to time every node and
+# every function call
+# memo: a memo.Memo caching the calls of pure functions, True for a new
+# one. Off by default: a later run can rebind a name a function of an
+# earlier run looked pure through
+# env: run in this Enviroemnt (its global variables) instead of a new one
+class Interpreter(object):
+    def __init__(self, profiler=None, memo=False, env=None) -> None:
+        def binop(node):
+            quick = node.cache
+            if quick is None:
+                quick = node.cache = quicken(node)
+            return quick(node, eval)
+
+        def number(node):
+            return int(node.value)
+
+        def string(node):
+            return node.value
+
+        def null(node):
+            return None
+
+        def map(node):
+            return {eval(key):eval(value) \
+                for key, value in node.body.items()}
+
+        def array(node):
+            return make_array([eval(item) for item in node.body])
+
+        def getitem(node):
+            container = eval(node.container)
+            index = eval(node.index)
+            return container[index]
+
+        def block(node):
+            for stmt in node.body:
+                result = eval(stmt)
+            return result # return last value of block
+
+        def ifstmt(node):
+            cond = eval(node.cond)
+            if cond:
+                return eval(node.body)
+            elif node.else_body is not None:
+                return eval(node.else_body)
+        
+        # No scope and no list of results per iteration, the value is null
+        def whilestmt(node):
+            cond = node.cond
+            body = node.body.body
+            while eval(cond):
+                for stmt in body:
+                    eval(stmt)
+
+        def forstmt(node):
+            name = node.name
+            body = node.body.body
+            for value in eval(node.iterable):
+                env.set_var(name, value)
+                for stmt in body:
+                    eval(stmt)
+
+        def defvar(node):
+            value = eval(node.value)
+            env.set_var(node.name, value)
+
+        def getvar(node):
+            return env.get_var(node.name)
+
+        def paramlist(node):
+            return node.body  # [ param...] list of strings
+
+        def defunc(node):
+            # Run when call
+            # params = eval(defun_node.params)
+            # body = eval(defun_node.body)
+
+            func = FuncObj(node.name, node.params, node.body,
+                env.current_scope)
+            if node in pure:
+                func.flag |= FuncObj.Flag.MEMO
+            env.set_var(node.name, func)
+
+        def arglist(node):
+            return [eval(arg) for arg in node.body]
+
+        def call(node):
+            func = eval(node.func)
+            args = eval(node.args)
+            return apply(func, args)
+
+        def apply(func, args):
+            if isinstance(func, ClsObj):
+                cls = func.dict['cls']
+                if 'call' not in cls.dict:
+                    raise Exception(f'Class {func.name} has no call method')
+                args.insert(0, func)
+                func = cls.dict['call']
+
+            if not isinstance(func, FuncObj):
+                raise Exception(f'{func} is not a function')
+
+            if func.flag & FuncObj.Flag.BOUNDED:
+                args.insert(0, func.obj)
+
+            if func.flag & FuncObj.Flag.BUILTIN:
+                return func.body(*args)
+
+            if func.flag & FuncObj.Flag.MEMO and memo:
+                return memo.call(func, args, enter)
+            return enter(func, args)
+
+        def enter(func, args):
+            params = eval(func.params)
+            if len(args) != len(params):
+                raise Exception(f'{func.name} expected {len(params)} args, \
+                    but got {len(args)}')
+
+            env.new_scope(func.scope)
+
+            [env.set_var(name, value)
+                for name, value in zip(params, args)]
+
+            result = eval(func.body)
+            env.free_scope()
+
+            return result
+
+        def defcls(node):
+            name = node.name
+            attrs = {}
+            for attr in node.body:
+                if isinstance(attr, parser.Defunc):
+                    func = FuncObj(attr.name, attr.params, attr.body,
+                        env.current_scope)
+                    attrs[attr.name] = func
+                elif isinstance(attr, parser.SetVar):
+                    value = eval(attr.value)
+                    attrs[attr.name] = value
+                else:
+                    raise Exception(f'Unknown attribute type: {attr}')
+        
+            cls = new_cls(env.metacls, name, None, attrs)
+            env.set_var(name, cls)
+
+        def setattr(node):
+            obj = eval(node.obj)
+            attr = node.attr
+            value = eval(node.value)
+            set_attr(obj, attr, value)
+
+        def getattr(node):
+            obj = eval(node.obj)
+            if node.cache is None:
+                node.cache = AttrCache(node.attr)
+            return node.cache.get(obj)
+
+        node_to_computer = {
+            parser.Number: number,
+            parser.String: string,
+            parser.Null: null,
+            parser.BinOp: binop,
+            parser.Block: block,
+            parser.IfStmt: ifstmt,
+            parser.WhileStmt: whilestmt,
+            parser.ForStmt: forstmt,
+            parser.Map: map,
+            parser.Array: array,
+            parser.GetItem: getitem,
+            parser.SetVar: defvar,
+            parser.GetVar: getvar,
+            parser.ParamList: paramlist,
+            parser.Defunc: defunc,
+            parser.ArgList: arglist,
+            parser.Call: call,
+            parser.DefCls: defcls,
+            parser.SetAttr: setattr,
+            parser.GetAttr: getattr,
+        }
+        if profiler is not None:
+            node_to_computer = profiler.wrap_nodes(node_to_computer)
+            apply = profiler.wrap_apply(apply)
+
+        def eval(node):
+            return node_to_computer[type(node)](node)
+
+        # Point the computers at the environment and the pure functions of
+        # a run, they are shared with the forks
+        def use(new_env, new_pure):
+            nonlocal env, pure
+            env = new_env
+            pure = new_pure
+
+        if memo is True:
+            memo = Memo()
+        pure = ()
+        self.memo = memo
+        self._eval = eval
+        self._use = use
+        self._builtins = init_env(apply) # never run in, copied by reset()
+        if env is None:
+            env = self._builtins.fork()
+        env.apply = apply
+        self.env = env
+
+    def run(self, ast):
+        env = self.env
+        depth = len(env._scope)
+        self._use(env, pure_functions(ast) if self.memo else ())
+        try:
+            return self._eval(ast)
+        finally:
+            del env._scope[depth:] # scopes left by an error
+
+    def fork(self):
+        session = object.__new__(Interpreter)
+        session.__dict__.update(self.__dict__)
+        session.env = self.env.fork()
+        return session
+
+    def reset(self):
+        self.env = self._builtins.fork()
+
+def interpreter(ast, profiler=None, memo=False, env=None):
+    return Interpreter(profiler, memo, env).run(ast)
 
 
 if __name__ == '__main__':
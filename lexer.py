@@ -1,6 +1,6 @@
 #! /bin/env python3
 
-from ply.lex import lex
+import cache
 
 # List of token names.   This is always required
 tokens = (
@@ -18,6 +18,8 @@ tokens = (
     'IF',
     'ELSE',
     'WHILE',
+    'FOR',
+    'IN',
     'EQ',
     'NE',
     'AND',
@@ -27,16 +29,33 @@ tokens = (
     'NULL',
 )
 
-def my_lexer():
+# Shared with the hand written lexer of fastlexer.py
+string_pattern = r'\"[^\"]*\"|\'[^\']*\''
+comment_pattern = r'//.*|\#.*'
+
+# Literal string containing all valid digits
+literals = r',.+-*/()[]{}=;<>!:'
+
+reserved = {
+    'if': 'IF',
+    'else': 'ELSE',
+    'while': 'WHILE',
+    'for': 'FOR',
+    'in': 'IN',
+    'def': 'DEF',
+    'class': 'CLASS',
+    'null': 'NULL',
+}
+
+def my_lexer(cache_dir=None):
+    from ply.lex import lex
+
     # Regular expression rules for simple tokens
     t_EQ = r'=='
     t_NE = r'!='
     t_AND = r'&&'
     t_OR = r'\|\|'
-    t_STRING = r'\"[^\"]*\"|\'[^\']*\''
-
-    # Literal string containing all valid digits
-    literals = r',.+-*/()[]{}=;<>!:'
+    t_STRING = string_pattern
 
     # A regular expression rule with some action code
     def t_NUMBER(t):
@@ -44,14 +63,6 @@ def my_lexer():
         t.value = int(t.value)    
         return t
 
-    reserved = {
-        'if': 'IF',
-        'else': 'ELSE',
-        'while': 'WHILE',
-        'def': 'DEF',
-        'class': 'CLASS',
-        'null': 'NULL',
-    }
     def t_IDENTIFIER(t):
         r'[a-zA-Z_][a-zA-Z_0-9]*'    
         t.type = reserved.get(t.value, 'IDENTIFIER')
@@ -65,15 +76,18 @@ def my_lexer():
     # A string containing ignored characters (spaces and tabs)
     t_ignore  = ' \t'
 
-    t_ignore_COMMENT = r'//.*|\#.*'
+    t_ignore_COMMENT = comment_pattern
 
     # Error handling rule
     def t_error(t):
         print("Illegal character '%s'" % t.value[0])
         t.lexer.skip(1)
 
-    # Build the lexer
-    return lex()
+    # Build the lexer, the master regex is cached in the cache directory
+    directory = cache.cache_dir(cache_dir)
+    lextab = 'lextab_' + cache.grammar_version()
+    return lex(optimize=True, outputdir=directory,
+        lextab=cache.load_module(directory, lextab) or lextab)
 
 
 if __name__ == '__main__':
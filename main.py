@@ -1,26 +1,148 @@
 #! /bin/env python3
 
+# Command line entry point
+#
+#   ./main.py [script ...] [-e tree|closure|vm] [-p yacc|pratt] [-O]
+#             [--frames N] [--stream] [--profile] [--inspect] [--bench [N]]
+#             [--export FILE [--max-depth N] [--max-children N]]
+#
+# Runs every script (test.py by default) and prints the value of its last
+# statement. Modules are imported by the options using them: a plain run
+# loads neither pyecharts (--inspect) nor the profiler.
 
+import argparse
+import time
 
+ENGINES = ('tree', 'closure', 'vm')
+PARSERS = ('yacc', 'pratt') # parser.BACKENDS
 
-
-if __name__ == '__main__':
-    from lexer import my_lexer
-    from parser import my_parser
+# frames: the frame limit of the vm, its default if None
+def engine_of(name, frames=None):
+    if name == 'closure':
+        from closure import closure_interpreter
+        return closure_interpreter
+    if name == 'vm':
+        from vm import vm_interpreter
+        if frames is None:
+            return vm_interpreter
+        return lambda ast: vm_interpreter(ast, max_depth=frames)
     from interpreter import interpreter
+    return interpreter
+
+def run(path, args):
+    if args.stream:
+        # Statement by statement, there is never a whole ast to inspect
+        from stream import run_stream
+        return run_stream(path)
+
+    from astcache import parse_file
+    ast = parse_file(path)
+
+    if args.optimize:
+        from optimizer import optimize
+        ast, report = optimize(ast)
+        for name, description in report:
+            print(f'{name:8}{description}')
+
+    profiler = None
+    if args.profile:
+        from interpreter import interpreter
+        from profiler import Profiler
 
-    from inspector import inspector
+        # --inspect draws the time of every node
+        profiler = Profiler(sites=args.inspect)
+        result = interpreter(ast, profiler=profiler)
+        print(profiler.table())
+        with open('profile.folded', 'w') as f: # flamegraph.pl input
+            f.write(profiler.collapsed())
+    else:
+        result = engine_of(args.engine, args.frames)(ast)
 
-    lexer = my_lexer()
-    parser = my_parser()
+    if args.inspect:
+        from inspector import inspector
+        inspector(ast, profile=profiler) # ast.html and ast.chunks/
+    if args.export:
+        from inspector import export
+        with open(args.export, 'w') as f:
+            export(ast, f, args.max_depth, args.max_children)
+    return result
 
-    source_file = "test.py"
-    data = open(source_file, 'r').read()
+# Time parsing and running path args.bench times, every run on a new ast
+# (the inline caches live in it)
+def bench(path, args):
+    import statistics
 
-    ast = parser.parse(data)
+    import parser
 
-    result = interpreter(ast)
+    with open(path) as f:
+        source = f.read()
+    engine = engine_of(args.engine, args.frames)
+    if args.optimize:
+        from optimizer import optimize
 
-    inspector(ast)
- 
-    print(result)
\ No newline at end of file
+    times = {'parse': [], 'run': []}
+    for _ in range(args.bench):
+        start = time.perf_counter()
+        ast = parser.parse(source)
+        times['parse'].append(time.perf_counter() - start)
+        if args.optimize:
+            ast, report = optimize(ast)
+
+        start = time.perf_counter()
+        engine(ast)
+        times['run'].append(time.perf_counter() - start)
+
+    for phase, seconds in times.items():
+        print(f'{path}: {phase:6}min {min(seconds):.6f}s  '
+            f'median {statistics.median(seconds):.6f}s')
+
+def arguments():
+    args = argparse.ArgumentParser(description='Run scripts of the language')
+    args.add_argument('scripts', nargs='*', default=['test.py'],
+        help='scripts to run, test.py if none')
+    args.add_argument('-e', '--engine', default='tree', choices=ENGINES)
+    args.add_argument('-p', '--parser', choices=PARSERS,
+        help='parser backend, $INTERPRETER_PARSER or yacc by default')
+    args.add_argument('-O', dest='optimize', action='store_true',
+        help='optimize the ast first')
+    args.add_argument('--frames', type=int, metavar='N',
+        help='call frames the vm keeps at once, $INTERPRETER_VM_FRAMES or '
+        '200000 by default')
+    args.add_argument('--stream', action='store_true',
+        help='parse and run one statement at a time')
+    args.add_argument('--profile', action='store_true',
+        help='time nodes and functions, write profile.folded, with '
+        '--inspect a heat map of the ast')
+    args.add_argument('--inspect', action='store_true',
+        help='render the ast to ast.html')
+    args.add_argument('--bench', type=int, nargs='?', const=5, metavar='N',
+        help='time parsing and running N times (5)')
+    args.add_argument('--export', metavar='FILE',
+        help='write the ast to FILE as JSON lines')
+    args.add_argument('--max-depth', type=int, metavar='N',
+        help='--export down to depth N')
+    args.add_argument('--max-children', type=int, metavar='N',
+        help='--export the first N children of a node')
+
+    parsed = args.parse_args()
+    if parsed.stream and (parsed.engine != 'tree' or parsed.optimize or
+            parsed.inspect or parsed.export or parsed.profile or parsed.bench):
+        args.error('--stream needs the tree engine, without -O, --inspect, '
+            '--export, --profile or --bench')
+    if parsed.frames is not None and (parsed.engine != 'vm' or
+            parsed.frames < 1):
+        args.error('--frames needs the vm engine and N >= 1')
+    if parsed.profile and (parsed.engine != 'tree' or parsed.bench):
+        args.error('--profile needs the tree engine, without --bench')
+    return parsed
+
+if __name__ == '__main__':
+    args = arguments()
+    if args.parser:
+        import parser
+        parser.default_backend = args.parser
+    for path in args.scripts:
+        if args.bench:
+            bench(path, args)
+        else:
+            print(run(path, args))
@@ -0,0 +1,206 @@
+#! /bin/env python3
+
+# Memoization of pure user functions.
+#
+# pure_functions(ast) finds the `def` statements whose result only depends
+# on their arguments: no SetAttr, no GetAttr (objects change under it), no
+# class or nested function, and every name they read that is not their
+# own is a function bound once in the program, which is pure too. So no
+# print, no new and no captured variable a later SetVar could change. A
+# local is their own only where it is assigned on every path before: read
+# before that, the name is the global one.
+#
+# The engines flag those functions with FuncObj.Flag.MEMO and route their
+# calls through Memo.call, a size bounded LRU cache per function keyed on
+# the arguments. Only immutable values are cached or used as keys: a map
+# or an object returned twice would be shared, an iterator or a function
+# argument may run user code every time it is used. Scripts can force it
+# with memoize(func) and turn it off with nomemo(func), both return the
+# function.
+#
+# Off by default in every engine: interpreter(ast, memo=True) turns it on.
+
+from collections import OrderedDict
+import weakref
+
+import parser
+
+def children_of(node):
+    if isinstance(node, parser.BinOp):
+        return (node.left, node.right)
+    if isinstance(node, parser.Map):
+        return [x for item in node.body.items() for x in item]
+    if isinstance(node, parser.GetItem):
+        return (node.container, node.index)
+    if isinstance(node, (parser.Block, parser.ArgList, parser.DefCls,
+            parser.Array)):
+        return node.body
+    if isinstance(node, parser.IfStmt):
+        return (node.cond, node.body) if node.else_body is None else \
+            (node.cond, node.body, node.else_body)
+    if isinstance(node, parser.WhileStmt):
+        return (node.cond, node.body)
+    if isinstance(node, parser.ForStmt):
+        return (node.iterable, node.body)
+    if isinstance(node, parser.SetVar):
+        return (node.value,)
+    if isinstance(node, parser.Defunc):
+        return (node.params, node.body)
+    if isinstance(node, parser.Call):
+        return (node.func, node.args)
+    if isinstance(node, parser.SetAttr):
+        return (node.obj, node.value)
+    if isinstance(node, parser.GetAttr):
+        return (node.obj,)
+    return ()
+
+def nodes_of(node):
+    yield node
+    for child in children_of(node):
+        yield from nodes_of(child)
+
+# Builtins whose result only depends on the arguments
+pure_builtins = ('sum', 'min', 'max', 'len', 'slice', 'array', 'range')
+
+impure_node = (parser.SetAttr, parser.GetAttr, parser.DefCls, parser.Defunc)
+
+class Impure(Exception):
+    pass
+
+# Names read by a function body which are not its own, None if the body
+# itself is impure
+def free_names(node):
+    from resolver import declared_names
+
+    # Walked in the order it runs, assigned: the locals set on every path
+    # so far. Any other name read is the global one, at least on a path
+    def walk(child, assigned):
+        if isinstance(child, impure_node):
+            raise Impure()
+        if isinstance(child, parser.SetVar):
+            walk(child.value, assigned)
+            assigned.add(child.name)
+        elif isinstance(child, parser.IfStmt):
+            walk(child.cond, assigned)
+            then = set(assigned)
+            walk(child.body, then)
+            otherwise = set(assigned)
+            if child.else_body is not None:
+                walk(child.else_body, otherwise)
+            assigned |= then & otherwise
+        elif isinstance(child, parser.WhileStmt):
+            # the first test and the first pass see the names before it
+            walk(child.cond, assigned)
+            walk(child.body, set(assigned))
+        elif isinstance(child, parser.ForStmt):
+            walk(child.iterable, assigned)
+            walk(child.body, assigned | {child.name})
+        elif isinstance(child, parser.Call):
+            if not isinstance(child.func, parser.GetVar):
+                raise Impure() # calls something computed
+            if child.func.name in own:
+                raise Impure() # calls a parameter or a local
+            walk(child.func, assigned)
+            walk(child.args, assigned)
+        elif isinstance(child, parser.GetVar):
+            if child.name not in assigned:
+                names.add(child.name)
+        else:
+            for grand in children_of(child):
+                walk(grand, assigned)
+
+    own = set(node.params.body) | set(declared_names(node.body))
+    names = set()
+    try:
+        walk(node.body, set(node.params.body))
+    except Impure:
+        return None
+    return names
+
+def pure_functions(ast):
+    def bind(name):
+        bindings[name] = bindings.get(name, 0) + 1
+
+    nodes = list(nodes_of(ast))
+    methods = {id(attr) for node in nodes if isinstance(node, parser.DefCls)
+        for attr in node.body if isinstance(attr, parser.Defunc)}
+    functions = []  # Defunc statements, class methods are not variables
+    bindings = {}   # name -> number of places binding it
+    for node in nodes:
+        if isinstance(node, parser.Defunc):
+            if id(node) not in methods:
+                functions.append(node)
+                bind(node.name)
+            [bind(param) for param in node.params.body]
+        elif isinstance(node, (parser.SetVar, parser.DefCls, parser.ForStmt)):
+            bind(node.name)
+
+    candidates = {}
+    for node in functions:
+        names = free_names(node)
+        if names is not None and bindings[node.name] == 1:
+            candidates[node] = names
+
+    # Drop the ones reading a name which is not a pure function, until
+    # nothing changes (mutual recursion stays pure)
+    builtins = {name for name in pure_builtins if name not in bindings}
+    while True:
+        pure_names = builtins | {node.name for node in candidates}
+        impure = [node for node, names in candidates.items()
+            if not names <= pure_names]
+        if not impure:
+            return set(candidates)
+        for node in impure:
+            del candidates[node]
+
+# Values a cached call can take and give, by exact type: not the runtime
+# objects (maps, arrays, iterators, functions, classes)
+immutable_types = (int, str, bool, type(None))
+
+class Memo(object):
+    # Per function cache entries
+    maxsize = 1024
+
+    def __init__(self, maxsize=None) -> None:
+        if maxsize is not None:
+            self.maxsize = maxsize
+        # FuncObj -> OrderedDict(key -> result), dropped with the function
+        self.caches = weakref.WeakKeyDictionary()
+        self.stats = {}  # function name -> {'hit': n, 'miss': n, 'skip': n}
+
+    def call(self, func, args, compute):
+        stats = self.stats.get(func.name)
+        if stats is None:
+            stats = self.stats[func.name] = {'hit': 0, 'miss': 0, 'skip': 0}
+
+        # 1 and True are equal, but functions can tell them apart
+        key = tuple((type(arg), arg) for arg in args)
+        for arg_type, arg in key:
+            if arg_type not in immutable_types:
+                stats['skip'] += 1
+                return compute(func, args)
+
+        cache = self.caches.get(func)
+        if cache is not None and key in cache:
+            stats['hit'] += 1
+            cache.move_to_end(key)
+            return cache[key]
+
+        stats['miss'] += 1
+        result = compute(func, args)
+        if type(result) not in immutable_types:
+            return result
+        cache = self.caches.get(func) # the recursive calls may have made it
+        if cache is None:
+            cache = self.caches[func] = OrderedDict()
+        cache[key] = result
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return result
+
+    def table(self):
+        lines = [f'{"function":24}{"hit":>10}{"miss":>10}{"skip":>10}']
+        for name, stats in sorted(self.stats.items()):
+            lines.append(f'{name:24}{stats["hit"]:10}{stats["miss"]:10}'
+                f'{stats["skip"]:10}')
+        return '\n'.join(lines)
@@ -0,0 +1,258 @@
+#! /bin/env python3
+
+# Ast optimizer, run between parse() and interpreter()
+#
+#   fold:   fold BinOp over constant Number/String/Null into a constant
+#   branch: drop the dead branch of an IfStmt with a constant condition
+#   dce:    drop pure statements of a Block whose value is never used
+#
+# The passes rewrite the tree bottom up in place, each one can be turned
+# off, and every rewrite is recorded in the returned report.
+
+import parser
+from interpreter import binary_operators
+
+# Don't fold into huge strings, e.g.  'a' * 100000000
+MAX_FOLDED_LENGTH = 4096
+
+literal_node = (parser.Number, parser.String, parser.Null)
+
+def literal_value(node):
+    if isinstance(node, parser.Number):
+        return int(node.value)
+    if isinstance(node, parser.String):
+        return node.value
+    return None
+
+# Length of the string left op right makes, 0 if it doesn't make one
+def string_length(op, left, right):
+    if op == '*' and isinstance(left, str) and isinstance(right, int):
+        return len(left) * max(right, 0)
+    if op == '*' and isinstance(left, int) and isinstance(right, str):
+        return max(left, 0) * len(right)
+    if op == '+' and isinstance(left, str) and isinstance(right, str):
+        return len(left) + len(right)
+    return 0
+
+# Value of a node built of literals only, raise ValueError if it isn't
+# one or can't be computed ahead of time. Strings longer than
+# MAX_FOLDED_LENGTH are never built, not even as a part
+def constant_value(node):
+    if isinstance(node, literal_node):
+        return literal_value(node)
+    if isinstance(node, parser.BinOp) and node.op in binary_operators:
+        left = constant_value(node.left)
+        right = constant_value(node.right)
+        if string_length(node.op, left, right) > MAX_FOLDED_LENGTH:
+            raise ValueError(f'{node.op} makes a string too long to fold')
+        try:
+            return binary_operators[node.op](left, right)
+        except Exception as e: # leave the error to the runtime
+            raise ValueError(e)
+    raise ValueError(f'{node} is not constant')
+
+def literal(value):
+    # Only values a literal node evaluates back to exactly, so no bool
+    # (1 < 2 is True, not 1) and no float (7 / 2)
+    if type(value) is int:
+        return parser.Number(value)
+    if type(value) is str and len(value) <= MAX_FOLDED_LENGTH:
+        return parser.String(value)
+    if value is None:
+        return parser.Null()
+    return None
+
+def is_pure(node):
+    if isinstance(node, literal_node):
+        return True
+    if isinstance(node, parser.Map):
+        return all(is_pure(key) and is_pure(value)
+            for key, value in node.body.items())
+    if isinstance(node, parser.Array):
+        return all(is_pure(item) for item in node.body)
+    try:
+        constant_value(node)
+        return True
+    except ValueError:
+        return False
+
+def describe(node):
+    if isinstance(node, parser.Number):
+        return str(node.value)
+    if isinstance(node, parser.String):
+        return repr(node.value)
+    if isinstance(node, parser.Null):
+        return 'null'
+    if isinstance(node, parser.BinOp):
+        return f'({describe(node.left)} {node.op} {describe(node.right)})'
+    if isinstance(node, parser.GetVar):
+        return node.name
+    return type(node).__name__
+
+def optimize(ast, fold=True, branch=True, dce=True):
+    report = [] # [(pass, description), ...]
+
+    def walk(node):
+        return node_to_optimizer.get(type(node), leaf)(node)
+
+    def leaf(node):
+        return node
+
+    def binop(node):
+        node.left = walk(node.left)
+        node.right = walk(node.right)
+        if not fold:
+            return node
+        try:
+            folded = literal(constant_value(node))
+        except ValueError:
+            return node
+        if folded is None:
+            return node
+        report.append(('fold', f'{describe(node)} -> {describe(folded)}'))
+        return folded
+
+    def map(node):
+        node.body = {walk(key): walk(value)
+            for key, value in node.body.items()}
+        return node
+
+    def array(node):
+        node.body = [walk(item) for item in node.body]
+        return node
+
+    def getitem(node):
+        node.container = walk(node.container)
+        node.index = walk(node.index)
+        return node
+
+    def block(node):
+        body = []
+        for stmt in node.body:
+            stmt = walk(stmt)
+            if isinstance(stmt, parser.Block): # inlined branch
+                body.extend(stmt.body)
+            else:
+                body.append(stmt)
+
+        if dce:
+            # Value of the last statement is the value of the block
+            *head, last = body
+            body = []
+            for stmt in head:
+                if is_pure(stmt):
+                    report.append(('dce', f'drop {describe(stmt)}'))
+                else:
+                    body.append(stmt)
+            body.append(last)
+
+        node.body = body
+        return node
+
+    def ifstmt(node):
+        node.cond = walk(node.cond)
+        node.body = walk(node.body)
+        has_else = node.else_body is not None
+        if has_else:
+            node.else_body = walk(node.else_body)
+        if not branch:
+            return node
+
+        try:
+            cond = constant_value(node.cond)
+        except ValueError:
+            return node
+
+        if cond:
+            report.append(('branch', f'if {describe(node.cond)} always true'))
+            return node.body
+        report.append(('branch', f'if {describe(node.cond)} always false'))
+        if has_else:
+            return node.else_body
+        return parser.Null()
+
+    def whilestmt(node):
+        node.cond = walk(node.cond)
+        node.body = walk(node.body)
+        if not branch:
+            return node
+
+        try:
+            cond = constant_value(node.cond)
+        except ValueError:
+            return node
+
+        if cond: # endless, still runs
+            return node
+        report.append(('branch', f'while {describe(node.cond)} never runs'))
+        return parser.Null()
+
+    def forstmt(node):
+        node.iterable = walk(node.iterable)
+        node.body = walk(node.body)
+        return node
+
+    def setvar(node):
+        node.value = walk(node.value)
+        return node
+
+    def defunc(node):
+        node.body = walk(node.body)
+        return node
+
+    def call(node):
+        node.func = walk(node.func)
+        node.args.body = [walk(arg) for arg in node.args.body]
+        return node
+
+    def defcls(node):
+        node.body = [walk(attr) for attr in node.body]
+        return node
+
+    def setattr(node):
+        node.obj = walk(node.obj)
+        node.value = walk(node.value)
+        return node
+
+    def getattr(node):
+        node.obj = walk(node.obj)
+        return node
+
+    node_to_optimizer = {
+        parser.BinOp: binop,
+        parser.Block: block,
+        parser.IfStmt: ifstmt,
+        parser.WhileStmt: whilestmt,
+        parser.ForStmt: forstmt,
+        parser.Map: map,
+        parser.Array: array,
+        parser.GetItem: getitem,
+        parser.SetVar: setvar,
+        parser.Defunc: defunc,
+        parser.Call: call,
+        parser.DefCls: defcls,
+        parser.SetAttr: setattr,
+        parser.GetAttr: getattr,
+    }
+
+    return walk(ast), report
+
+
+if __name__ == '__main__':
+    print('Test optimizer')
+
+    from lexer import my_lexer
+    from parser import my_parser
+
+    my_lexer = my_lexer()
+    # Build the parser
+    my_parser = my_parser()
+
+    source_file = "test.py"
+    data = open(source_file, 'r').read()
+
+    ast = my_parser.parse(data)
+
+    ast, report = optimize(ast)
+    for name, description in report:
+        print(f'{name:8}{description}')
@@ -1,45 +1,69 @@
 #! /bin/env python3
 
+import copy
 import logging
+import os
+import threading
 
-from ply.yacc import yacc
-
-from lexer import tokens
+import cache
+from lexer import tokens, my_lexer
 
+# Nodes are slotted: no per instance __dict__, large sources build
+# hundreds of thousands of them
 class AstNode(object):
-    pass
+    __slots__ = ()
 
 class BinOp(AstNode):
+    __slots__ = ('left', 'right', 'op', 'cache')
+
     def __init__(self, left, op, right) -> None:
         self.left = left
         self.right = right
         self.op = op
+        self.cache = None # quickened computer, filled by the interpreter
 
 class Number(AstNode):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 class String(AstNode):
+    __slots__ = ('value',)
+
     def __init__(self, value) -> None:
         self.value = value
 
 class Null(AstNode):
-    pass
+    __slots__ = ()
 
 class Map(AstNode):
+    __slots__ = ('body',)
+
     def __init__(self, key, value):
         self.body = {key: value}
 
     def append_item(self, key, value):
         self.body[key] = value
 
+# Array literal -  [item, ...]
+class Array(AstNode):
+    __slots__ = ('body',)
+
+    def __init__(self, items) -> None:
+        self.body = items
+
 # Get a item of list or dictionary -  X[index]
 class GetItem(AstNode):
+    __slots__ = ('container', 'index')
+
     def __init__(self, container, index):
         self.container = container
         self.index = index
         
 class Block(AstNode):
+    __slots__ = ('body',)
+
     def __init__(self, stmt):
         self.body = [ stmt ]
 
@@ -48,23 +72,48 @@ class Block(AstNode):
 
 
 class IfStmt(AstNode):
+    __slots__ = ('cond', 'body', 'else_body')
+
     def __init__(self, cond, body) -> None:
         self.cond = cond
         self.body = body
+        self.else_body = None
 
     def add_else_body(self, else_body):
         self.else_body = else_body
 
+class WhileStmt(AstNode):
+    __slots__ = ('cond', 'body')
+
+    def __init__(self, cond, body) -> None:
+        self.cond = cond
+        self.body = body
+
+# for (name in iterable) { body }
+class ForStmt(AstNode):
+    __slots__ = ('name', 'iterable', 'body')
+
+    def __init__(self, name, iterable, body) -> None:
+        self.name = name
+        self.iterable = iterable
+        self.body = body
+
 class SetVar(AstNode):
+    __slots__ = ('name', 'value')
+
     def __init__(self, name, value) -> None:
         self.name = name
         self.value = value
 
 class GetVar(AstNode):
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
 class ParamList(AstNode):
+    __slots__ = ('body',)
+
     def __init__(self, param=None) -> None:
         self.body = []
         if param:
@@ -74,12 +123,16 @@ class ParamList(AstNode):
         self.body.append(param)
 
 class Defunc(AstNode):
+    __slots__ = ('name', 'params', 'body')
+
     def __init__(self, name, params, body):
         self.name = name
         self.params = params
         self.body = body
 
 class ArgList(AstNode):
+    __slots__ = ('body',)
+
     def __init__(self, arg=None) -> None:
         self.body = []
         if arg:
@@ -89,12 +142,17 @@ class ArgList(AstNode):
         self.body.append(arg)
 
 class Call(AstNode):
+    __slots__ = ('func', 'args')
+
     def __init__(self, func, args) -> None:
         self.func = func
         self.args = args
 
 class DefCls(AstNode):
+    __slots__ = ('name', 'body')
+
     def __init__(self):
+        self.name = None
         self.body = []
     def add_attr(self, attr):
         self.body.append(attr)
@@ -102,6 +160,8 @@ class DefCls(AstNode):
         self.name = name
 
 class SetAttr(AstNode):
+    __slots__ = ('obj', 'attr', 'value')
+
     def __init__(self, obj, attr, value) -> None:
         self.obj = obj
         self.attr = attr
@@ -109,11 +169,16 @@ class SetAttr(AstNode):
 
 # Get class attribute -  X.attr
 class GetAttr(AstNode):
+    __slots__ = ('obj', 'attr', 'cache')
+
     def __init__(self, obj, attr):
         self.obj = obj
         self.attr = attr
+        self.cache = None # inline cache, filled by the interpreter
  
-def my_parser():
+def my_parser(cache_dir=None):
+    from ply.yacc import yacc
+
     start = 'block'
     # start = 'stmt'
 
@@ -239,6 +304,12 @@ def my_parser():
         else:
             raise Exception('Invalid map')
 
+    def p_expr_array(p):
+        '''
+        expr ::= '[' arg_list ']'
+        '''
+        p[0] = Array(p[2].body)
+
     def p_expr_get_item(p):
         '''
         expr ::= expr '[' expr ']'
@@ -264,6 +335,8 @@ def my_parser():
             | set_var ';'
             | set_attr ';'
             | if_stmt 
+            | while_stmt
+            | for_stmt
             | def_func 
             | def_cls
             | ';'
@@ -296,6 +369,18 @@ def my_parser():
         else:
             raise Exception(f'If statement length({len(p)}) error: ', p[1:])
 
+    def p_while_stmt(p):
+        '''
+        while_stmt ::= WHILE '(' expr ')' '{' block '}'
+        '''
+        p[0] = WhileStmt(p[3], p[6])
+
+    def p_for_stmt(p):
+        '''
+        for_stmt ::= FOR '(' IDENTIFIER IN expr ')' '{' block '}'
+        '''
+        p[0] = ForStmt(p[3], p[5], p[8])
+
     def p_def_cls(p):
         '''
         cls_body ::= ';'
@@ -320,9 +405,72 @@ def my_parser():
             raise Exception(f'Class length({len(p)}) error: ', p[1:])
 
     def p_error(p):
+        if p is None:
+            raise SyntaxError('end of input')
         raise SyntaxError(f"line {p.lineno}")
         
-    return yacc()
+    # Build the parser, the LALR tables are cached in the cache directory
+    directory = cache.cache_dir(cache_dir)
+    tabmodule = 'parsetab_' + cache.grammar_version()
+    return yacc(debug=False, optimize=True, outputdir=directory,
+        tabmodule=cache.load_module(directory, tabmodule) or tabmodule)
+
+# Parsing from several threads. ply's parse() falls back to the lexer built
+# last (ply.lex.lexer, a module global), and the LRParser and the lexer
+# keep the state of the parse going on, so they can't be shared. Their
+# tables are read only though: a Parser is a copy of an LRParser and of a
+# lexer built once per cache_dir, cheap enough to make one per thread.
+#
+# fast_lexer: tokenize with fastlexer.FastLexer instead of ply's lexer
+# backend: 'yacc' for my_parser(), 'pratt' for the hand written parser of
+# pratt.py (same ast, no tables), default_backend if not given. Set
+# INTERPRETER_PARSER or default_backend to change it for parse() too
+BACKENDS = ('yacc', 'pratt')
+default_backend = os.environ.get('INTERPRETER_PARSER', 'yacc')
+
+class Parser(object):
+    _lock = threading.Lock()
+    _built = {} # cache_dir -> (LRParser, lexer)
+
+    def __init__(self, cache_dir=None, fast_lexer=False,
+            backend=None) -> None:
+        self.backend = backend or default_backend
+        if self.backend not in BACKENDS:
+            raise Exception(f'Unknown parser backend {self.backend}, '
+                f'one of {", ".join(BACKENDS)}')
+        if self.backend == 'pratt':
+            import pratt
+            self.lr = self.lexer = None
+            self.pratt = pratt.parse
+            return
+
+        with Parser._lock: # yacc() and lex() are not thread safe
+            built = Parser._built.get(cache_dir)
+            if built is None:
+                built = Parser._built[cache_dir] = (my_parser(cache_dir),
+                    my_lexer(cache_dir))
+        self.lr = copy.copy(built[0])
+        if fast_lexer:
+            from fastlexer import FastLexer
+            self.lexer = FastLexer()
+        else:
+            self.lexer = built[1].clone()
+
+    # lineno: line of the source in the whole file, for the errors
+    def parse(self, source, lineno=1):
+        if self.lr is None:
+            return self.pratt(source, lineno)
+        self.lexer.lineno = lineno
+        return self.lr.parse(source, lexer=self.lexer)
+
+_local = threading.local()
+
+# Parse with the Parser of the calling thread, of the current backend
+def parse(source, lineno=1):
+    parser = getattr(_local, 'parser', None)
+    if parser is None or parser.backend != default_backend:
+        parser = _local.parser = Parser()
+    return parser.parse(source, lineno)
 
 
 
@@ -0,0 +1,258 @@
+#! /bin/env python3
+
+# Hand written parser of the grammar of parser.my_parser(): recursive
+# descent for the statements, precedence climbing for the expressions.
+# It builds the same nodes out of the arrays of fastlexer.tokenize(), no
+# LALR table is generated or loaded:
+#
+#   ast = pratt.parse(source)
+#
+# parser.Parser(backend='pratt'), or ./main.py --parser pratt, uses it.
+#
+# Conflicts are resolved the way yacc resolves them with the precedence
+# table: '.' binds tightest, a call or a subscript following a binary
+# operation applies to the whole of it, `a + f(x)` is `(a + f)(x)`. Syntax
+# errors are raised at the same token, SyntaxError('line N').
+
+from fastlexer import tokenize, kind_of, FastLexer, NUMBER, STRING, \
+    IDENTIFIER, COMMENT
+from parser import BinOp, Number, String, Null, Map, Array, GetItem, \
+    Block, IfStmt, WhileStmt, ForStmt, SetVar, GetVar, ParamList, Defunc, \
+    ArgList, Call, DefCls, SetAttr, GetAttr
+
+END = 253 # after the last token
+
+IF, ELSE, WHILE, FOR, IN, DEF, CLASS, NULL = (kind_of[word] for word in
+    ('IF', 'ELSE', 'WHILE', 'FOR', 'IN', 'DEF', 'CLASS', 'NULL'))
+LPAREN, RPAREN, LBRACKET, RBRACKET, LBRACE, RBRACE, COMMA, SEMI, ASSIGN, \
+    COLON, DOT = (kind_of[char] for char in '()[]{},;=:.')
+
+# Level of the binary operators by kind, from my_parser()'s precedence
+# table, 0 for the other kinds
+LEVELS = {'OR': 3, 'AND': 4, '>': 5, '<': 5, 'EQ': 5, 'NE': 5, '+': 6,
+    '-': 6, '*': 7, '/': 7}
+levels = [0] * 256
+for operator, level in LEVELS.items():
+    levels[kind_of[operator]] = level
+
+# lineno: line of the source in the whole file, for the errors
+def parse(source, lineno=1):
+    tokens = tokenize(source)
+    kinds = tokens.kinds
+    texts = tokens.texts
+    if COMMENT in kinds:
+        keep = [kind != COMMENT for kind in kinds]
+        kinds = bytes(kind for kind in kinds if kind != COMMENT)
+        texts = [text for text, kept in zip(texts, keep) if kept]
+    else:
+        kinds = bytes(kinds)
+    kinds += bytes([END])
+    texts.append('')
+    at = 0 # index of the next token
+
+    # The token at is not allowed there
+    def error():
+        if kinds[at] == END:
+            raise SyntaxError('end of input')
+        lexer = FastLexer()
+        lexer.lineno = lineno
+        lexer.input(source, tokens)
+        for _ in range(at):
+            lexer.token()
+        raise SyntaxError(f'line {lexer.token().lineno}')
+
+    def expect(kind):
+        nonlocal at
+        if kinds[at] != kind:
+            error()
+        at += 1
+
+    def name():
+        nonlocal at
+        if kinds[at] != IDENTIFIER:
+            error()
+        at += 1
+        return texts[at - 1]
+
+    # Expression of the operators of a higher level, the postfix '(' and
+    # '[' at level 0 only (yacc reduces a binary operation before them)
+    def expr(level):
+        nonlocal at
+        left = operand()
+        while True:
+            kind = kinds[at]
+            if levels[kind] > level:
+                at += 1
+                left = BinOp(left, texts[at - 1], expr(levels[kind]))
+            elif kind == DOT:
+                at += 1
+                left = GetAttr(left, name())
+            elif level:
+                return left
+            elif kind == LPAREN:
+                at += 1
+                left = Call(left, arg_list(RPAREN))
+            elif kind == LBRACKET:
+                at += 1
+                index = expr(0)
+                expect(RBRACKET)
+                left = GetItem(left, index)
+            else:
+                return left
+
+    def operand():
+        nonlocal at
+        kind = kinds[at]
+        at += 1
+        if kind == IDENTIFIER:
+            return GetVar(texts[at - 1])
+        if kind == NUMBER:
+            return Number(int(texts[at - 1]))
+        if kind == STRING:
+            return String(texts[at - 1][1:-1])
+        if kind == LPAREN:
+            node = expr(0)
+            expect(RPAREN)
+            return node
+        if kind == LBRACKET:
+            return Array(arg_list(RBRACKET).body)
+        if kind == LBRACE:
+            key = expr(0)
+            expect(COLON)
+            node = Map(key, expr(0))
+            while kinds[at] == COMMA:
+                at += 1
+                key = expr(0)
+                expect(COLON)
+                node.append_item(key, expr(0))
+            expect(RBRACE)
+            return node
+        if kind == NULL:
+            return Null()
+        at -= 1
+        error()
+
+    # Arguments up to close. The list may start empty: f(, a) is f(a)
+    def arg_list(close):
+        nonlocal at
+        if kinds[at] == close:
+            at += 1
+            return ArgList()
+        args = ArgList() if kinds[at] == COMMA else ArgList(expr(0))
+        while kinds[at] == COMMA:
+            at += 1
+            args.add_arg(expr(0))
+        expect(close)
+        return args
+
+    # '{' block '}'
+    def body():
+        expect(LBRACE)
+        node = block(RBRACE)
+        expect(RBRACE)
+        return node
+
+    def block(close):
+        node = Block(stmt())
+        while kinds[at] != close:
+            node.append_stmt(stmt())
+        return node
+
+    def stmt():
+        nonlocal at
+        kind = kinds[at]
+        if kind == IDENTIFIER and kinds[at + 1] == ASSIGN:
+            node = set_var()
+        elif kind == SEMI:
+            at += 1
+            return ';'
+        elif kind == IF:
+            at += 1
+            expect(LPAREN)
+            cond = expr(0)
+            expect(RPAREN)
+            node = IfStmt(cond, body())
+            while kinds[at] == ELSE:
+                at += 1
+                node.add_else_body(body())
+            return node
+        elif kind == WHILE:
+            at += 1
+            expect(LPAREN)
+            cond = expr(0)
+            expect(RPAREN)
+            return WhileStmt(cond, body())
+        elif kind == FOR:
+            at += 1
+            expect(LPAREN)
+            var = name()
+            expect(IN)
+            iterable = expr(0)
+            expect(RPAREN)
+            return ForStmt(var, iterable, body())
+        elif kind == DEF:
+            return def_func()
+        elif kind == CLASS:
+            return def_cls()
+        else:
+            node = expr(0)
+            # x.attr = value, attr not in parentheses
+            if kinds[at] == ASSIGN and type(node) is GetAttr and \
+                    kinds[at - 2] == DOT:
+                at += 1
+                node = SetAttr(node.obj, node.attr, expr(0))
+        expect(SEMI)
+        return node
+
+    def set_var():
+        var = name()
+        expect(ASSIGN)
+        return SetVar(var, expr(0))
+
+    # The parameter list may start empty too: def f(, a) is def f(a)
+    def def_func():
+        nonlocal at
+        at += 1
+        func = name()
+        expect(LPAREN)
+        params = ParamList(name()) if kinds[at] == IDENTIFIER else \
+            ParamList()
+        while kinds[at] == COMMA:
+            at += 1
+            params.add_param(name())
+        expect(RPAREN)
+        return Defunc(func, params, body())
+
+    # The body is methods and 'name = value;', the first one can be ';'
+    def def_cls():
+        nonlocal at
+        at += 1
+        cls_name = name()
+        expect(LBRACE)
+        node = DefCls()
+        if kinds[at] == SEMI:
+            at += 1
+        else:
+            node.add_attr(member())
+        while kinds[at] != RBRACE:
+            node.add_attr(member())
+        at += 1
+        node.set_name(cls_name)
+        return node
+
+    def member():
+        if kinds[at] == DEF:
+            return def_func()
+        node = set_var()
+        expect(SEMI)
+        return node
+
+    return block(END)
+
+
+if __name__ == '__main__':
+    print('Test pratt')
+
+    with open('test.py') as f:
+        ast = parse(f.read())
+    print(ast, len(ast.body))
@@ -0,0 +1,148 @@
+#! /bin/env python3
+
+# Opt-in profiler of the tree walking interpreter.
+#
+#   profiler = Profiler()
+#   interpreter(ast, profiler=profiler)
+#   print(profiler.table())
+#   open('profile.folded', 'w').write(profiler.collapsed())
+#
+# Records, per ast node type and per user function (FuncObj.name, or
+# ClsObj.name for instantiations), the number of calls plus the inclusive
+# and exclusive time. The interpreter only wraps its dispatch when given a
+# profiler, so there is nothing to pay when profiling is off.
+#
+# collapsed() is the folded stack format of flamegraph.pl / speedscope:
+# one `outer;inner;leaf microseconds` line per call path of functions.
+#
+# Profiler(sites=True) also records the calls and the inclusive time of
+# every ast node (sites, keyed by the node), which inspector(ast,
+# profile=profiler) draws as a heat map on the tree.
+
+import time
+
+class Stats(object):
+    __slots__ = ('count', 'inclusive', 'exclusive', 'active')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.active = 0 # frames of it on the stack, recursion is timed once
+
+class Profiler(object):
+    def __init__(self, clock=time.perf_counter, sites=False) -> None:
+        self.clock = clock
+        self.sites = {} if sites else None # ast node -> Stats
+        self.nodes = {}     # node type name -> Stats
+        self.functions = {} # function name -> Stats
+        self.stacks = {}    # (outer, ..., name) -> exclusive seconds
+        self._node_stack = []     # [[stats, children seconds], ]
+        self._function_stack = [] # [[stats, children seconds, path], ]
+
+    def _stats(self, table, name):
+        stats = table.get(name)
+        if stats is None:
+            stats = table[name] = Stats()
+        return stats
+
+    def _enter(self, stack, stats, *extra):
+        stats.count += 1
+        stats.active += 1
+        stack.append([stats, 0.0, *extra])
+
+    def _exit(self, stack, elapsed):
+        frame = stack.pop()
+        stats = frame[0]
+        stats.active -= 1
+        if not stats.active:
+            stats.inclusive += elapsed
+        exclusive = elapsed - frame[1]
+        stats.exclusive += exclusive
+        if stack:
+            stack[-1][1] += elapsed
+        return frame, exclusive
+
+    # Wrap every computer of the dispatch table node_type -> computer
+    def wrap_nodes(self, node_to_computer):
+        return {node_type: self._wrap_node(node_type.__name__, computer)
+            for node_type, computer in node_to_computer.items()}
+
+    def _wrap_node(self, name, computer):
+        stats = self._stats(self.nodes, name)
+        stack = self._node_stack
+        clock = self.clock
+        sites = self.sites
+
+        def profiled(node):
+            self._enter(stack, stats)
+            start = clock()
+            try:
+                return computer(node)
+            finally:
+                self._exit(stack, clock() - start)
+
+        def profiled_site(node):
+            site = sites.get(node)
+            if site is None:
+                site = sites[node] = Stats()
+            site.count += 1
+            site.active += 1
+            self._enter(stack, stats)
+            start = clock()
+            try:
+                return computer(node)
+            finally:
+                elapsed = clock() - start
+                self._exit(stack, elapsed)
+                site.active -= 1
+                if not site.active: # recursion is timed once
+                    site.inclusive += elapsed
+        return profiled if sites is None else profiled_site
+
+    # Wrap apply(func, args), the call of a function value
+    def wrap_apply(self, apply):
+        stack = self._function_stack
+        clock = self.clock
+
+        def profiled(func, args):
+            name = getattr(func, 'name', None) or '<anonymous>'
+            path = (stack[-1][2] if stack else ()) + (name,)
+            self._enter(stack, self._stats(self.functions, name), path)
+            start = clock()
+            try:
+                return apply(func, args)
+            finally:
+                frame, exclusive = self._exit(stack, clock() - start)
+                self.stacks[path] = self.stacks.get(path, 0.0) + exclusive
+        return profiled
+
+    def table(self, sort='exclusive', limit=None):
+        lines = []
+        for title, table in (('node type', self.nodes),
+                ('function', self.functions)):
+            rows = sorted(((name, stats) for name, stats in table.items()
+                if stats.count), key=lambda row: getattr(row[1], sort),
+                reverse=True)[:limit]
+            lines.append(f'{title:24}{"calls":>10}{"inclusive":>12}'
+                f'{"exclusive":>12}{"per call":>12}')
+            for name, stats in rows:
+                lines.append(f'{name:24}{stats.count:10}'
+                    f'{stats.inclusive:12.6f}{stats.exclusive:12.6f}'
+                    f'{stats.inclusive / stats.count * 1e6:10.2f}us')
+            lines.append('')
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        return ''.join(f'{";".join(path)} {round(seconds * 1e6)}\n'
+            for path, seconds in sorted(self.stacks.items()))
+
+
+if __name__ == '__main__':
+    from astcache import parse_file
+    from interpreter import interpreter
+
+    profiler = Profiler()
+    interpreter(parse_file('test.py'), profiler=profiler)
+    print(profiler.table())
+    print(profiler.collapsed())
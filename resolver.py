@@ -0,0 +1,156 @@
+#! /bin/env python3
+
+# Static resolution of variables.
+#
+# A function scope can only get variables from its parameters and from
+# the SetVar/Defunc/DefCls statements of its own body, so every name can
+# be given a slot in an array backed frame before running. A GetVar is
+# resolved to the (hops, slot) addresses of every enclosing function which
+# declares the name, innermost first: the first one which is already set
+# wins, same as walking the scope chain. When none is set (or the name is
+# declared in no function), the lookup falls back to the global variables,
+# which stay in a dict because they are open to late binding.
+
+import parser
+
+class Resolution(object):
+    def __init__(self) -> None:
+        self.addresses = {} # GetVar -> [(hops, slot), ...]
+        self.slots = {}     # SetVar/Defunc/DefCls -> slot, absent if global
+        self.frames = {}    # Defunc -> (frame size, [slot of each param])
+
+def declared_names(block):
+    names = []
+    def declare(node):
+        if isinstance(node, parser.Block):
+            [declare(stmt) for stmt in node.body]
+        elif isinstance(node, parser.IfStmt):
+            declare(node.body)
+            if node.else_body is not None:
+                declare(node.else_body)
+        elif isinstance(node, parser.WhileStmt):
+            declare(node.body)
+        elif isinstance(node, parser.ForStmt):
+            if node.name not in names:
+                names.append(node.name)
+            declare(node.body)
+        elif isinstance(node, (parser.SetVar, parser.Defunc, parser.DefCls)):
+            if node.name not in names:
+                names.append(node.name)
+    declare(block)
+    return names
+
+def resolve(ast):
+    resolution = Resolution()
+    scopes = [] # [{name: slot}, ...] of enclosing functions, innermost last
+
+    def walk(node):
+        node_to_resolver[type(node)](node)
+
+    def children(*nodes):
+        [walk(node) for node in nodes]
+
+    def bind(node):
+        if scopes:
+            resolution.slots[node] = scopes[-1][node.name]
+
+    def function(node):
+        params = node.params.body
+        names = list(dict.fromkeys(params))
+        names += [name for name in declared_names(node.body)
+            if name not in names]
+        scope = {name: slot for slot, name in enumerate(names)}
+        resolution.frames[node] = (len(names), [scope[p] for p in params])
+
+        scopes.append(scope)
+        walk(node.body)
+        scopes.pop()
+
+    def leaf(node):
+        pass
+
+    def binop(node):
+        children(node.left, node.right)
+
+    def map(node):
+        for key, value in node.body.items():
+            children(key, value)
+
+    def array(node):
+        children(*node.body)
+
+    def getitem(node):
+        children(node.container, node.index)
+
+    def block(node):
+        children(*node.body)
+
+    def ifstmt(node):
+        children(node.cond, node.body)
+        if node.else_body is not None:
+            walk(node.else_body)
+
+    def whilestmt(node):
+        children(node.cond, node.body)
+
+    def forstmt(node):
+        walk(node.iterable)
+        bind(node)
+        walk(node.body)
+
+    def setvar(node):
+        walk(node.value)
+        bind(node)
+
+    def getvar(node):
+        depth = len(scopes)
+        resolution.addresses[node] = [
+            (depth - 1 - level, scopes[level][node.name])
+            for level in reversed(range(depth))
+            if node.name in scopes[level]
+        ]
+
+    def defunc(node):
+        function(node)
+        bind(node)
+
+    def call(node):
+        children(node.func, *node.args.body)
+
+    def defcls(node):
+        for attr in node.body:
+            if isinstance(attr, parser.Defunc):
+                function(attr)
+            else: # class attribute, not a variable
+                walk(attr.value)
+        bind(node)
+
+    def setattr(node):
+        children(node.obj, node.value)
+
+    def getattr(node):
+        walk(node.obj)
+
+    node_to_resolver = {
+        parser.Number: leaf,
+        parser.String: leaf,
+        parser.Null: leaf,
+        parser.BinOp: binop,
+        parser.Block: block,
+        parser.IfStmt: ifstmt,
+        parser.WhileStmt: whilestmt,
+        parser.ForStmt: forstmt,
+        parser.Map: map,
+        parser.Array: array,
+        parser.GetItem: getitem,
+        parser.SetVar: setvar,
+        parser.GetVar: getvar,
+        parser.Defunc: defunc,
+        parser.Call: call,
+        parser.DefCls: defcls,
+        parser.SetAttr: setattr,
+        parser.GetAttr: getattr,
+    }
+
+    walk(ast)
+    return resolution
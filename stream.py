@@ -0,0 +1,120 @@
+#! /bin/env python3
+
+# Streaming execution: read the source in chunks, cut it into top level
+# statements, parse and run them one at a time in the same environment.
+#
+# Only the statement being run has an ast, so the peak memory is bounded
+# by the largest statement rather than the size of the script, and the
+# first statements run before the end of the file is read.
+#
+# Memoization is off: a later statement can rebind a name a function
+# looked pure through.
+
+import re
+
+# What the splitter looks at: strings and comments (their contents are
+# skipped), brackets and ';'. A lone quote is a string going on in the
+# next chunk.
+TOKEN = re.compile(r'''"[^"]*"|'[^']*'|//.*|\#.*|["'{}()\[\];]''')
+COMMENT = re.compile(r'//.*|\#.*')
+
+OPEN = ('{', '(', '[')
+CLOSE = ('}', ')', ']')
+
+# A top level {...} ends the statement (if, def, class, ...), unless what
+# follows goes on with it: else, ';' of a map literal, a.b, f(), ...
+CONTINUE = re.compile(r'else\b|[;.(\[+\-*/=<>!&|]')
+
+# Yield (line, source) of each top level statement of the text read by
+# read(size)
+def split_statements(read, chunk_size=1 << 16):
+    text = ''
+    pos = 0         # scanned up to here
+    start = 0       # start of the statement being scanned
+    line = 1        # line of start
+    depth = 0
+    closed = False  # last token closed a top level {...}
+    eof = False
+
+    # The statement up to end, None if there is nothing to run in it
+    def cut(end):
+        nonlocal start, line
+        source = text[start:end]
+        statement = (line, source)
+        start = end
+        line += source.count('\n')
+        if COMMENT.sub('', source).strip() in ('', ';'):
+            return None
+        return statement
+
+    while not eof:
+        chunk = read(chunk_size)
+        eof = not chunk
+        text += chunk
+
+        for match in TOKEN.finditer(text, pos):
+            token = match.group()
+            if not eof and (token in ('"', "'") or token[0] in '/#' and
+                    match.end() == len(text)):
+                break # may go on in the next chunk
+            if token[0] in '/#':
+                pos = match.end()
+                continue
+
+            if closed:
+                # The first thing after the }: in between or this token
+                gap = text[pos:match.start()]
+                following = gap.lstrip()
+                if not following:
+                    following = token
+                    at = match.start()
+                else:
+                    at = pos + len(gap) - len(following)
+                if not CONTINUE.match(following):
+                    statement = cut(at)
+                    if statement is not None:
+                        yield statement
+                closed = False
+            pos = match.end()
+
+            if token in OPEN:
+                depth += 1
+            elif token in CLOSE:
+                depth -= 1
+                closed = depth == 0 and token == '}'
+            elif token == ';' and depth == 0:
+                statement = cut(pos)
+                if statement is not None:
+                    yield statement
+
+        text = text[start:]
+        pos -= start
+        start = 0
+
+    statement = cut(len(text))
+    if statement is not None:
+        yield statement
+
+# Run the script at path statement by statement, return the value of the
+# last one
+def run_stream(path, chunk_size=1 << 16, profiler=None):
+    from parser import Parser
+    from interpreter import Interpreter
+
+    parser = Parser()
+    session = Interpreter(profiler=profiler)
+    result = None
+    with open(path) as f:
+        for line, source in split_statements(f.read, chunk_size):
+            ast = parser.parse(source, line) # errors give lines of the file
+            result = session.run(ast)
+            del ast
+    return result
+
+
+if __name__ == '__main__':
+    print('Test stream')
+
+    with open('test.py') as f:
+        for line, source in split_statements(f.read, 64):
+            print(f'{line:4} {source.strip()[:60]!r}')
@@ -0,0 +1,239 @@
+#! /bin/env python3
+
+# Stack based virtual machine running the bytecode built by bytecode.py.
+#
+# A call to a user function pushes a new frame and keeps going in the same
+# dispatch loop, so script recursion doesn't recurse in python. A call in
+# tail position (TAIL_CALL) replaces the running frame instead, tail
+# recursion runs in constant space. Other recursion is limited by
+# max_depth, a count of the frames kept at once, not a memory budget: the
+# size of a frame depends on the variables of its scope. It is
+# $INTERPRETER_VM_FRAMES or 200000 by default, ./main.py --frames N.
+
+import os
+
+from bytecode import compile, operators, \
+    LOAD_CONST, LOAD_NAME, STORE_NAME, POP_TOP, BINARY_OP, BUILD_MAP, \
+    GET_ITEM, GET_ATTR, SET_ATTR, JUMP, POP_JUMP_IF_FALSE, MAKE_FUNCTION, \
+    MAKE_CLASS, CALL, RETURN, TAIL_CALL, JUMP_IF_FALSE_OR_POP, \
+    JUMP_IF_TRUE_OR_POP, BUILD_ARRAY, GET_ITER, FOR_ITER
+from arrays import make_array
+from interpreter import FuncObj, ClsObj, set_attr, new_cls, init_env
+
+class Frame(object):
+    __slots__ = ('code', 'scope', 'pc')
+
+    def __init__(self, code, scope) -> None:
+        self.code = code
+        self.scope = scope  # (parent_scope, {variables})
+        self.pc = 0
+
+MAX_DEPTH = int(os.environ.get('INTERPRETER_VM_FRAMES', 200000))
+
+# End of the iterator of FOR_ITER
+STOP = object()
+
+def run(code, max_depth=MAX_DEPTH):
+    # Call of a function value from python (map, filter, ...): its frames
+    # run in a dispatch loop of their own
+    def apply(func, args):
+        if isinstance(func, ClsObj):
+            cls = func.dict['cls']
+            if 'call' not in cls.dict:
+                raise Exception(f'Class {func.name} has no call method')
+            args.insert(0, func)
+            func = cls.dict['call']
+
+        if not isinstance(func, FuncObj):
+            raise Exception(f'{func} is not a function')
+
+        if func.flag & FuncObj.Flag.BOUNDED:
+            args.insert(0, func.obj)
+
+        if func.flag & FuncObj.Flag.BUILTIN:
+            return func.body(*args)
+
+        params = func.params
+        if len(args) != len(params):
+            raise Exception(f'{func.name} expected {len(params)} args, \
+                but got {len(args)}')
+        scope = (func.scope, dict(zip(params, args)))
+        return execute(Frame(func.body, scope))
+
+    # Run frame until it returns
+    def execute(frame):
+        stack = []
+        frames = []
+
+        # Cache the running frame in locals, saved back into frame on call
+        instrs, consts, names, caches = frame.code.code, frame.code.consts, \
+            frame.code.names, frame.code.caches
+        scope = frame.scope
+        pc = 0
+
+        while True:
+            op = instrs[pc]
+            arg = instrs[pc + 1]
+            pc += 2
+
+            if op == LOAD_NAME:
+                name = names[arg]
+                lookup = scope
+                while lookup:
+                    if name in lookup[1]:
+                        stack.append(lookup[1][name])
+                        break
+                    lookup = lookup[0]
+                else:
+                    raise Exception(f'Variable not found: {name}')
+
+            elif op == LOAD_CONST:
+                stack.append(consts[arg])
+
+            elif op == BINARY_OP:
+                right = stack.pop()
+                stack[-1] = operators[arg](stack[-1], right)
+
+            elif op == STORE_NAME:
+                scope[1][names[arg]] = stack.pop()
+
+            elif op == POP_TOP:
+                stack.pop()
+
+            elif op == POP_JUMP_IF_FALSE:
+                if not stack.pop():
+                    pc = arg
+
+            elif op == JUMP:
+                pc = arg
+
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    stack.pop()
+                else:
+                    pc = arg
+
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    stack.pop()
+
+            elif op == CALL or op == TAIL_CALL:
+                args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                func = stack.pop()
+
+                if isinstance(func, ClsObj):
+                    cls = func.dict['cls']
+                    if 'call' not in cls.dict:
+                        raise Exception(f'Class {func.name} has no call method')
+                    args.insert(0, func)
+                    func = cls.dict['call']
+
+                if not isinstance(func, FuncObj):
+                    raise Exception(f'{func} is not a function')
+
+                if func.flag & FuncObj.Flag.BOUNDED:
+                    args.insert(0, func.obj)
+
+                if func.flag & FuncObj.Flag.BUILTIN:
+                    stack.append(func.body(*args))
+                    continue
+
+                params = func.params
+                if len(args) != len(params):
+                    raise Exception(f'{func.name} expected {len(params)} args, \
+                        but got {len(args)}')
+
+                if op == CALL:
+                    if len(frames) >= max_depth:
+                        raise Exception(f'Call depth over {max_depth} frames '
+                            f'in {func.name}')
+                    frame.pc = pc
+                    frames.append(frame)
+                frame = Frame(func.body, (func.scope, dict(zip(params, args))))
+                instrs, consts, names, caches = frame.code.code, \
+                    frame.code.consts, frame.code.names, frame.code.caches
+                scope = frame.scope
+                pc = 0
+
+            elif op == RETURN:
+                if not frames:
+                    return stack.pop()
+                frame = frames.pop()
+                instrs, consts, names, caches = frame.code.code, \
+                    frame.code.consts, frame.code.names, frame.code.caches
+                scope = frame.scope
+                pc = frame.pc
+
+            elif op == GET_ATTR:
+                stack[-1] = caches[arg].get(stack[-1])
+
+            elif op == SET_ATTR:
+                value = stack.pop()
+                obj = stack.pop()
+                set_attr(obj, names[arg], value)
+
+            elif op == GET_ITEM:
+                index = stack.pop()
+                stack[-1] = stack[-1][index]
+
+            elif op == BUILD_MAP:
+                items = stack[len(stack) - 2 * arg:]
+                del stack[len(stack) - 2 * arg:]
+                stack.append(dict(zip(items[::2], items[1::2])))
+
+            elif op == GET_ITER:
+                stack[-1] = iter(stack[-1])
+
+            elif op == FOR_ITER:
+                value = next(stack[-1], STOP)
+                if value is STOP:
+                    stack.pop()
+                    pc = arg
+                else:
+                    stack.append(value)
+
+            elif op == BUILD_ARRAY:
+                items = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                stack.append(make_array(items))
+
+            elif op == MAKE_FUNCTION:
+                func = consts[arg]
+                stack.append(FuncObj(func.name, func.params, func, scope))
+
+            elif op == MAKE_CLASS:
+                name = stack.pop()
+                items = stack[len(stack) - 2 * arg:]
+                del stack[len(stack) - 2 * arg:]
+                attrs = dict(zip(items[::2], items[1::2]))
+                stack.append(new_cls(env.metacls, name, None, attrs))
+
+            else:
+                raise Exception(f'Unknown opcode: {op}')
+
+    env = init_env(apply)
+    return execute(Frame(code, env.global_scope))
+
+def vm_interpreter(ast, max_depth=MAX_DEPTH):
+    return run(compile(ast), max_depth)
+
+
+if __name__ == '__main__':
+    print('Test vm')
+
+    from lexer import my_lexer
+    from parser import my_parser
+
+    my_lexer = my_lexer()
+    # Build the parser
+    my_parser = my_parser()
+
+    source_file = "test.py"
+    data = open(source_file, 'r').read()
+
+    ast = my_parser.parse(data)
+
+    result = vm_interpreter(ast)